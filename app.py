@@ -1,54 +1,176 @@
 import streamlit as st
 import pandas as pd
 import database as db
+from submit_handler import clean_etsy_url, handle_submit
 import json
-from urllib.parse import quote_plus, urlparse, urlunparse
-from bs4 import BeautifulSoup
+try:
+    import orjson # Optional: faster JSON-LD parsing (falls back to json)
+except ImportError:
+    orjson = None
+from urllib.parse import quote_plus
+from lxml import etree
 from datetime import datetime, date
+from functools import lru_cache
 import re
+import string
 import webbrowser
-import time
 import subprocess
 import platform
+import shutil
+import queue
+import threading
 import numpy as np
+import pyarrow as pa
 
 # --- Initialization ---
-db.initialize_db() # Initialize DB early
+@st.cache_resource
+def initialize_db_once():
+    """Creates/migrates the schema once per server process instead of on every rerun."""
+    db.initialize_db()
+    return True
+
+initialize_db_once() # Initialize DB early
+# Copy-on-Write: derived frames share memory until written (always on from pandas 3.0)
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
 
 # --- Opportunity Tracker Helper Functions ---
+# Fixed parts of the Etsy search URL (only the keyword and min price vary per call)
+_ETSY_SEARCH_URL_HEAD = "https://www.etsy.com/uk/search?q="
+_ETSY_SEARCH_URL_MIN = "&ref=search_bar&explicit=1&custom_price=1&min="
+_ETSY_SEARCH_URL_TAIL = "&is_best_seller=true"
+_EVERBEE_SEARCH_URL = "https://app.everbee.io/product-analytics?search_term="
+_SHOP_PATH_RE = re.compile(r'/shop/([A-Za-z0-9_-]+)') # Group 1: shop name
+_ETSY_SHOP_URL_RE = re.compile(r"https?://(?:www\.)?etsy\.com/(?:[a-z]{2}/)?shop/[A-Za-z0-9_-]+", re.IGNORECASE)
+
+@lru_cache(maxsize=1024)
 def generate_etsy_url(keyword, min_price=25):
     if not keyword: return ""
-    query = quote_plus(keyword)
-    return f"https://www.etsy.com/uk/search?q={query}&ref=search_bar&explicit=1&custom_price=1&min={min_price}&is_best_seller=true"
-
-def clean_etsy_url(url):
-    if not url or '?' not in url: return url
-    # Ensure it handles potential missing protocol by adding it if needed for parsing
-    if not url.startswith(('http://', 'https://')):
-        url = 'https://' + url # Assume https
-    try:
-        parsed = urlparse(url)
-        # Reconstruct URL with only scheme, netloc, path
-        cleaned = urlunparse((parsed.scheme, parsed.netloc, parsed.path, '', '', ''))
-        # Remove trailing slash if present
-        if cleaned.endswith('/'):
-             cleaned = cleaned[:-1]
-        return cleaned
-    except ValueError:
-        # Handle potential errors during parsing/unparsing
-        print(f"Warning: Could not parse/clean URL: {url}")
-        return url # Return original on error
+    return f"{_ETSY_SEARCH_URL_HEAD}{quote_plus(keyword)}{_ETSY_SEARCH_URL_MIN}{min_price}{_ETSY_SEARCH_URL_TAIL}"
 
 def extract_shop_name_from_url(url):
     """Extracts the shop name from a cleaned Etsy shop URL."""
     if not url or not isinstance(url, str):
         return None
     # Regex to find /shop/ followed by the shop name characters
-    match = re.search(r'/shop/([A-Za-z0-9_-]+)', url)
+    match = _SHOP_PATH_RE.search(url)
     if match:
         return match.group(1)
     return None
 
+# Free-text opportunity columns held as Arrow strings (compact, vectorized str ops)
+_OPPORTUNITY_TEXT_COLUMNS = ['product_title', 'shop_name', 'niche_tags', 'notes', 'aliexpress_urls', 'category',
+                             'listing_type', 'conversion_rate', 'listing_age', 'shop_age_overall']
+
+# Numeric opportunity columns as pandas nullable dtypes (a missing count stays an integer column, not float/object)
+_OPPORTUNITY_NUMERIC_DTYPES = {
+    "id": "Int64", "est_monthly_sales": "Int64", "total_sales": "Int64", "views": "Int64", "favorites": "Int64",
+    "last_30_days_sales": "Int64", "monthly_reviews": "Int64",
+    "price": "Float64", "shipping_cost": "Float64", "est_monthly_revenue": "Float64", "last_30_days_revenue": "Float64",
+}
+
+# Columns shown in the Saved Opportunities table, in display order (the only ones loaded from the database)
+_OPPORTUNITY_DISPLAY_COLUMNS = ("id", "product_title", "shop_name", "price", "est_monthly_revenue",
+                                "est_monthly_sales", "last_30_days_sales", "last_30_days_revenue",
+                                "total_sales", "listing_age", "shop_age_overall",
+                                "category", "product_url", "shop_url", "processing_time",
+                                "shipping_cost", "views", "favorites", "conversion_rate", #"monthly_reviews",
+                                "listing_type", "is_digital", "niche_tags",
+                                "aliexpress_urls", "notes", "added_at", "everbee_tags")
+
+@st.cache_data(show_spinner=False)
+def load_opportunities():
+    """Saved opportunities (display columns only) as a DataFrame, cached across reruns.
+    Call clear_opportunity_caches() after adding or deleting an opportunity."""
+    df = db.get_all_opportunities(columns=_OPPORTUNITY_DISPLAY_COLUMNS)
+    if df is not None and not df.empty:
+        text_columns = [col for col in _OPPORTUNITY_TEXT_COLUMNS if col in df.columns]
+        df[text_columns] = df[text_columns].astype('string[pyarrow]')
+        df = df.astype({col: dtype for col, dtype in _OPPORTUNITY_NUMERIC_DTYPES.items() if col in df.columns})
+    return df
+
+@st.cache_data(show_spinner=False)
+def opportunity_search_text():
+    """Case-folded 'title<US>shop<US>tags' per load_opportunities() row, built once for the filter box.
+    The unit separator keeps a search term from matching across two fields."""
+    df = load_opportunities()
+    if df is None or df.empty: return pd.Series(dtype=object)
+    return (df['product_title'].fillna('') + '\x1f' + df['shop_name'].fillna('') + '\x1f' + df['niche_tags'].fillna('')).str.casefold()
+
+def clear_opportunity_caches():
+    """Drops the cached opportunities table, its search text and the last filter result after a database change."""
+    load_opportunities.clear(); opportunity_search_text.clear()
+    st.session_state.opportunity_filter_cache = None
+
+_OPPORTUNITY_PAGE_ROWS = 500 # Saved Opportunities rows sent to the browser per "Show more" step
+
+def show_more_opportunities():
+    """on_click for the Saved Opportunities "Show more" button."""
+    st.session_state.opportunity_rows_shown += _OPPORTUNITY_PAGE_ROWS
+
+# --- Background Tab Opening ---
+_OS_SYSTEM = platform.system() # Looked up once, not per URL
+# Chrome Incognito launcher for this OS (URLs are appended); empty when unsupported
+if _OS_SYSTEM == "Darwin": # macOS
+    _CHROME_INCOGNITO_ARGS = ['open', '-na', 'Google Chrome', '--args', '--incognito']
+elif _OS_SYSTEM == "Windows":
+    _CHROME_INCOGNITO_ARGS = ['chrome', '--incognito']
+elif _OS_SYSTEM == "Linux": # Resolved here with shutil.which instead of spawning `which` per click
+    _CHROME_INCOGNITO_ARGS = ['google-chrome' if shutil.which('google-chrome') else 'chromium-browser', '--incognito']
+else:
+    _CHROME_INCOGNITO_ARGS = []
+
+_INCOGNITO_EXIT_WAIT = 5 # Seconds to wait for a launcher error before assuming the browser took the URLs
+
+def _open_tabs_incognito(urls):
+    """Opens all urls in Chrome Incognito with a single browser launch. Returns True on success."""
+    try:
+        if _CHROME_INCOGNITO_ARGS:
+            cmd_args = [*_CHROME_INCOGNITO_ARGS, *urls]
+            # Popen, not run: a freshly started Chrome keeps running, so only an early exit is checked
+            proc = subprocess.Popen(cmd_args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                returncode = proc.wait(timeout=_INCOGNITO_EXIT_WAIT)
+            except subprocess.TimeoutExpired:
+                return True # Still running: the browser itself was started with the URLs
+            if returncode == 0:
+                return True
+            print(f"Incognito command failed with exit code {returncode}")
+    except FileNotFoundError: print(f"Could not find browser command for incognito mode.")
+    except Exception as e: print(f"Error running incognito command: {e}")
+    return False
+
+def _tab_worker(tab_queue):
+    """Opens each queued batch of URLs (one incognito launch, default browser per URL as fallback)."""
+    while True:
+        urls = tab_queue.get()
+        try:
+            if not _open_tabs_incognito(urls): # Fallback
+                for url in urls:
+                    try: webbrowser.open_new_tab(url)
+                    except Exception as web_e: print(f"Failed to open {url} in any browser: {web_e}")
+        finally:
+            tab_queue.task_done()
+
+@st.cache_resource
+def get_tab_queue():
+    """Queue feeding a single daemon tab-opening thread (created once per server, survives reruns)."""
+    tab_queue = queue.Queue()
+    threading.Thread(target=_tab_worker, args=(tab_queue,), daemon=True, name="etsy-tab-opener").start()
+    return tab_queue
+
+# Patterns like "30 Apr" or "06-08 May". Groups: 1=start_day, 2=end_day (optional), 3=month
+_DELIVERY_DATE_RE = re.compile(r'(\d{1,2})(?:-(\d{1,2}))?\s+([A-Za-z]{3})')
+
+# English month abbreviations as Etsy prints them, lowercased -> month number
+_MONTH_NUM = {m: i for i, m in enumerate(['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], 1)}
+
+def _day_month_date(day, month, year):
+    """date for e.g. ("06", "May") in the given year, without strptime. Raises ValueError (unknown month, bad day)."""
+    month_num = _MONTH_NUM.get(month.lower())
+    if month_num is None: raise ValueError(f"Unknown month: {month}")
+    return date(year, month_num, int(day))
+
 def calculate_days_until_delivery(date_str):
     """Calculates days from today until the estimated delivery date/range."""
     if not date_str:
@@ -60,7 +182,7 @@ def calculate_days_until_delivery(date_str):
 
     # Regex to find patterns like \"30 Apr\" or \"06-08 May\" 
     # Groups: 1=start_day, 2=end_day (optional), 3=month
-    match = re.search(r'(\d{1,2})(?:-(\d{1,2}))?\s+([A-Za-z]{3})', date_str)
+    match = _DELIVERY_DATE_RE.search(date_str)
     if not match:
         return date_str # Return original string if format not recognized
 
@@ -68,33 +190,30 @@ def calculate_days_until_delivery(date_str):
     end_day = match.group(2) # This will be None if it's not a range like "DD-DD Month"
     month = match.group(3)
     
-    start_date_str = f"{start_day} {month}" # Reconstruct e.g., "06 May"
-
-    def parse_date_with_year(d_str):
+    def parse_date_with_year(day):
         try:
-            # Try parsing with current year
-            dt = datetime.strptime(f"{d_str} {current_year}", '%d %b %Y').date()
+            # Try the current year first
+            dt = _day_month_date(day, month, current_year)
             # If date is in the past, assume next year
             if dt < today:
-                dt = datetime.strptime(f"{d_str} {current_year + 1}", '%d %b %Y').date()
+                dt = _day_month_date(day, month, current_year + 1)
             return dt
         except ValueError:
             return None # Handle parsing errors
 
-    start_date = parse_date_with_year(start_date_str)
+    start_date = parse_date_with_year(start_day)
     if not start_date:
         return date_str # Return original if start date fails
 
     delta_start = (start_date - today).days
 
     if end_day: # If end_day (group 2) was captured, it's a DD-DD Month range
-        end_date_str = f"{end_day} {month}" # Reconstruct e.g., "08 May"
-        end_date = parse_date_with_year(end_date_str)
+        end_date = parse_date_with_year(end_day)
         if end_date:
             # Ensure end date is not before start date (handles year rollover)
             if end_date < start_date:
                  # Assume end date is next year relative to start_date's year
-                 end_date = datetime.strptime(f"{end_date_str} {start_date.year + 1}", '%d %b %Y').date()
+                 end_date = _day_month_date(end_day, month, start_date.year + 1)
 
             delta_end = (end_date - today).days
             if delta_start >= 0 and delta_end >= 0:
@@ -111,9 +230,72 @@ def calculate_days_until_delivery(date_str):
 
     return time_str
 
+# --- Etsy HTML Parsing (lxml tree + compiled XPath) ---
+# Content is re-encoded to UTF-8 before parsing. Whitespace-only text nodes and the id index are
+# never used by the lookups below (stripped text skips blank strings), so don't build them.
+_ETSY_HTML_PARSER = etree.HTMLParser(encoding='utf-8', remove_blank_text=True, collect_ids=False)
+_ETSY_JSON_LD_XPATH = etree.XPath('(//script[@type="application/ld+json"])[1]') # Only the first block is decoded
+_ETSY_CANONICAL_XPATH = etree.XPath('//link[contains(concat(" ", normalize-space(@rel), " "), " canonical ")]')
+_ETSY_H1_XPATH = etree.XPath('//h1')
+# First price region only, then the first price paragraph inside it
+_ETSY_PRICE_XPATH = etree.XPath(
+    '(//*[@data-buy-box-region="price"])[1]//p[contains(@class, "wt-text-title-larger") '
+    'or contains(@class, "wt-text-title-03") or contains(@class, "wt-text-heading-03")]'
+)
+_ETSY_SHOP_LINK_XPATH = etree.XPath('//a[contains(@href, "/shop/") and not(contains(@href, "reviews"))]')
+_ETSY_DESCRIPTION_P_XPATH = etree.XPath('(//div[@data-id="description-text"])[1]//p') # Paragraphs of the first description div
+_ETSY_REVIEW_DATE_XPATH = etree.XPath( # Date paragraphs of the first reviews div, in one query
+    '(//div[starts-with(@id, "reviews")])[1]//p[(contains(@class, "wt-text-caption") or contains(@class, "wt-text-body-01")) and contains(@class, "wt-text-gray")]'
+)
+_ETSY_SHIPPING_XPATH = etree.XPath('//div[@id="shipping-and-returns-div"]')
+_ETSY_EDD_LI_XPATH = etree.XPath('.//li[@data-shipping-estimated-delivery]')
+_ETSY_EDD_VALUE_XPATH = etree.XPath('.//span[@data-shipping-edd-value]')
+_SHIPPING_BY_RE = re.compile(r' by ', re.IGNORECASE)
+_SHIPPING_EDGE_PUNCT_RE = re.compile(r'^[^\w\d]+|[^\w\d]+$')
+_DELIVERY_COST_RE = re.compile(r'delivery cost:', re.IGNORECASE)
+_COST_AMOUNT_RE = re.compile(r'[\£\$](\d+\.?\d*)')
+_FREE_DELIVERY_RE = re.compile(r'free delivery|free shipping', re.IGNORECASE)
+_PRICE_STRIP = str.maketrans('', '', '£$,+') # Currency symbols, thousands separators, trailing '+'
+_NON_PRICE_CHARS_RE = re.compile(r'[^\d.]') # Everything but digits and the decimal point (price_str -> float)
+_NON_TEXT_TAGS = frozenset(['script', 'style', 'template'])
+# Review-date fallback: a month-name probe (substring, as before) and a direct '%d %b, %Y' parse.
+# The date pattern mirrors what strptime accepted, minus its per-call format handling.
+_REVIEW_MONTH_RE = re.compile(r'Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec')
+_REVIEW_DATE_RE = re.compile(r'(3[01]|[12]\d|0[1-9]|[1-9]| [1-9])\s+(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec),\s+(\d\d\d\d)', re.IGNORECASE)
+
+def _visible_strings(el):
+    """Text nodes under el in document order, skipping comments and script/style/template content."""
+    if el.text: yield el.text
+    for child in el:
+        if isinstance(child.tag, str) and child.tag not in _NON_TEXT_TAGS:
+            yield from _visible_strings(child)
+        if child.tail: yield child.tail
+
+def _element_text(el, separator=''):
+    """Stripped, non-empty text of el joined by separator (same result as BS4 get_text(strip=True))."""
+    stripped = map(str.strip, _visible_strings(el))
+    if separator: # Blank pieces only matter when they would add a separator
+        stripped = filter(None, stripped)
+    return separator.join(stripped)
+
+def _iter_strings(el):
+    """All text nodes under el (comments included) in document order, each with the element containing it."""
+    if el.text: yield el.text, (el if isinstance(el.tag, str) else el.getparent())
+    for child in el:
+        yield from _iter_strings(child)
+        if child.tail: yield child.tail, el
+
+def _find_string(strings, predicate):
+    """First (text, container) pair from strings whose text matches predicate, or None."""
+    return next((pair for pair in strings if predicate(pair[0])), None)
+
+# Re-parsing the same paste is a lookup; ttl bounds how stale the delivery-day count can get
+@st.cache_data(show_spinner=False, max_entries=64, ttl=3600)
 def parse_etsy_html_content(html_content):
     """Parses pasted HTML content from an Etsy product page to extract details, prioritizing JSON-LD."""
-    soup = BeautifulSoup(html_content, 'lxml')
+    root = etree.fromstring(html_content.encode('utf-8'), _ETSY_HTML_PARSER)
+    if root is None: # Blank/comment-only paste: nothing to search
+        root = etree.Element('html')
     data = {
         'product_url': None,
         'product_title': None,
@@ -127,10 +309,11 @@ def parse_etsy_html_content(html_content):
     }
 
     # --- Attempt 1: Parse JSON-LD Structured Data --- 
-    json_ld_script = soup.find('script', {'type': 'application/ld+json'})
-    if json_ld_script:
+    json_ld_scripts = _ETSY_JSON_LD_XPATH(root)
+    if json_ld_scripts:
         try:
-            structured_data = json.loads(json_ld_script.string)
+            json_ld_text = json_ld_scripts[0].text # Raw script text straight to the decoder
+            structured_data = orjson.loads(json_ld_text) if orjson else json.loads(json_ld_text)
             # Ensure it looks like product data
             if structured_data.get('@type') == 'Product':
                 data['product_url'] = clean_etsy_url(structured_data.get('url'))
@@ -154,15 +337,12 @@ def parse_etsy_html_content(html_content):
                 
                 # Extract review dates
                 reviews = structured_data.get('review', [])
-                review_dates = []
-                if isinstance(reviews, list):
-                    for review in reviews:
-                        if isinstance(review, dict) and review.get('datePublished'):
-                             # Date is already YYYY-MM-DD
-                            review_dates.append(review['datePublished'])
+                # Dates are already YYYY-MM-DD
+                review_dates = [review['datePublished'] for review in reviews
+                                if isinstance(review, dict) and review.get('datePublished')] if isinstance(reviews, list) else []
                 data['review_dates_str'] = ", ".join(review_dates)
 
-        except json.JSONDecodeError:
+        except json.JSONDecodeError: # orjson.JSONDecodeError subclasses this
             print("Error decoding JSON-LD") # Log error if needed
         except Exception as e:
              print(f"Error processing JSON-LD: {e}")
@@ -170,36 +350,35 @@ def parse_etsy_html_content(html_content):
     # --- Attempt 2: Fallback to HTML Parsing (if key data missing from JSON or JSON failed) ---
     # Fallback for Product URL if not found in JSON-LD
     if not data.get('product_url'):
-        canonical_link_tag = soup.find('link', {'rel': 'canonical'})
-        if canonical_link_tag and canonical_link_tag.get('href'):
-            data['product_url'] = clean_etsy_url(canonical_link_tag.get('href'))
+        canonical_links = _ETSY_CANONICAL_XPATH(root)
+        if canonical_links and canonical_links[0].get('href'):
+            data['product_url'] = clean_etsy_url(canonical_links[0].get('href'))
 
     # Fallback for Product Title if not found in JSON-LD
     if not data.get('product_title'):
-        title_tag = soup.find('h1')
-        if title_tag: data['product_title'] = title_tag.get_text(strip=True)
+        title_tags = _ETSY_H1_XPATH(root)
+        if title_tags: data['product_title'] = _element_text(title_tags[0])
 
     # Fallback for Price if not found in JSON-LD
     if not data.get('price_str'):
-        price_parent = soup.find(attrs={"data-buy-box-region": "price"})
-        if price_parent:
-            # Look for common price paragraph classes, including wt-text-title-larger
-            price_tag = price_parent.find('p', class_=lambda x: x and ('wt-text-title-larger' in x or 'wt-text-title-03' in x or 'wt-text-heading-03' in x))
-            if price_tag:
-                # Remove currency symbols, commas, and the trailing '+' if present
-                price_text = price_tag.get_text(strip=True).replace('£', '').replace('$', '').replace(',', '').replace('+','')
-                try:
-                    data['price_str'] = str(float(price_text.split()[0]))
-                except (ValueError, IndexError):
-                    pass # Ignore if parsing fails
+        # Look for common price paragraph classes, including wt-text-title-larger
+        price_tags = _ETSY_PRICE_XPATH(root)
+        if price_tags:
+            # Remove currency symbols, commas, and the trailing '+' if present
+            price_text = _element_text(price_tags[0]).translate(_PRICE_STRIP)
+            try:
+                data['price_str'] = str(float(price_text.split()[0]))
+            except (ValueError, IndexError):
+                pass # Ignore if parsing fails
     
     # Fallback for Shop Name and URL (URL often requires this)
     if not data.get('shop_name') or not data.get('shop_url'):
-        shop_link_tag = soup.find('a', href=lambda x: x and '/shop/' in x and 'reviews' not in x)
-        if shop_link_tag:
+        shop_links = _ETSY_SHOP_LINK_XPATH(root)
+        if shop_links:
+            shop_link_tag = shop_links[0]
             # Only overwrite shop_name if not found via JSON
             if not data.get('shop_name'):
-                 data['shop_name'] = shop_link_tag.get_text(strip=True)
+                 data['shop_name'] = _element_text(shop_link_tag)
             # Always try to get shop URL from here
             shop_href = shop_link_tag.get('href')
             if shop_href:
@@ -207,62 +386,66 @@ def parse_etsy_html_content(html_content):
 
     # Fallback/Supplement for Description if not found in JSON-LD
     if not data.get('description_notes'):
-        description_tag = soup.find('div', {'data-id': 'description-text'})
-        if description_tag:
-            data['description_notes'] = '\n'.join([p.get_text(strip=True) for p in description_tag.find_all('p')])
+        # One paragraph per line; stays empty (same as not found) when there is no description div
+        data['description_notes'] = '\n'.join([_element_text(p) for p in _ETSY_DESCRIPTION_P_XPATH(root)])
 
     # Fallback/Supplement for Review Dates if not found/incomplete in JSON-LD
     # (Could add logic to merge JSON dates and HTML dates if needed, but keep simple for now)
     if not data.get('review_dates_str'):
         review_dates_html = []
-        reviews_section = soup.find('div', {'id': lambda x: x and x.startswith('reviews')})
-        if reviews_section:
-            date_tags = reviews_section.find_all('p', class_=lambda x: x and ('wt-text-caption' in x or 'wt-text-body-01' in x) and 'wt-text-gray' in x)
-            for tag in date_tags:
-                 date_text = tag.get_text(strip=True)
-                 if ',' in date_text and any(month in date_text for month in ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']):
-                     try:
-                         parsed_date = datetime.strptime(date_text, '%d %b, %Y')
-                         review_dates_html.append(parsed_date.strftime('%Y-%m-%d'))
-                     except ValueError:
-                         pass
+        for tag in _ETSY_REVIEW_DATE_XPATH(root):
+            date_text = _element_text(tag)
+            if ',' in date_text and _REVIEW_MONTH_RE.search(date_text):
+                date_match = _REVIEW_DATE_RE.fullmatch(date_text)
+                if date_match:
+                    try:
+                        parsed_date = datetime(int(date_match.group(3)), _MONTH_NUM[date_match.group(2).lower()], int(date_match.group(1)))
+                        review_dates_html.append(parsed_date.strftime('%Y-%m-%d'))
+                    except ValueError:
+                        pass
         if review_dates_html: # Only overwrite if HTML parsing found dates
             data['review_dates_str'] = ", ".join(review_dates_html)
 
     # --- Shipping Info (Always from HTML) ---
     est_delivery_days = ""
     shipping_cost_str = "" # Initialize here
-    shipping_section = soup.find('div', {'id': 'shipping-and-returns-div'})
+    shipping_sections = _ETSY_SHIPPING_XPATH(root)
     
-    if shipping_section:
+    if shipping_sections:
+        shipping_section = shipping_sections[0]
         # --- Try original method first ---
-        edd_li = shipping_section.find('li', {'data-shipping-estimated-delivery': True})
-        if edd_li:
-            edd_value_span = edd_li.find('span', {'data-shipping-edd-value': True})
-            if edd_value_span:
-                date_range_str = edd_value_span.get_text(strip=True)
+        edd_lis = _ETSY_EDD_LI_XPATH(shipping_section)
+        if edd_lis:
+            edd_li = edd_lis[0]
+            edd_value_spans = _ETSY_EDD_VALUE_XPATH(edd_li)
+            if edd_value_spans:
+                date_range_str = _element_text(edd_value_spans[0])
                 print(f"DEBUG Shipping: Attempt 1 - Found date string via span: '{date_range_str}'") # DEBUG
                 est_delivery_days = calculate_days_until_delivery(date_range_str)
             else:
                 # Fallback text search if specific span not found within edd_li
-                 arrival_tag = edd_li.find(string=lambda t: t and ('get it by' in t.lower() or 'arrives by' in t.lower()))
-                 if arrival_tag:
-                     date_part = arrival_tag.strip().split('by')[-1].strip()
+                 arrival_match = _find_string(_iter_strings(edd_li), lambda t: 'get it by' in (t_lower := t.lower()) or 'arrives by' in t_lower)
+                 if arrival_match:
+                     date_part = arrival_match[0].strip().split('by')[-1].strip()
                      print(f"DEBUG Shipping: Attempt 2 - Found date string via text fallback within li: '{date_part}'") # DEBUG
                      est_delivery_days = calculate_days_until_delivery(date_part)
         
         # --- If original method failed, broaden the search within the section ---
-        if not est_delivery_days:
+        # Every tag's text below is a run of the section's visible text, so one scan of that
+        # text decides whether the per-tag walk (re-joining nested text per tag) can find anything
+        section_text_lower = _element_text(shipping_section, separator=' ').lower() if not est_delivery_days else ''
+        if 'get it by' in section_text_lower or 'arrives by' in section_text_lower:
             # Search for any common text element containing "Get it by" or "Arrives by"
-            possible_tags = shipping_section.find_all(['p', 'span', 'div', 'li'])
+            possible_tags = shipping_section.iterdescendants('p', 'span', 'div', 'li')
             for tag in possible_tags:
-                tag_text = tag.get_text(strip=True, separator=' ')
-                if 'get it by' in tag_text.lower() or 'arrives by' in tag_text.lower():
+                tag_text = _element_text(tag, separator=' ')
+                tag_text_lower = tag_text.lower()
+                if 'get it by' in tag_text_lower or 'arrives by' in tag_text_lower:
                     try:
                         # Extract the part after " by " (case-insensitive)
-                        date_part = re.split(r' by ', tag_text, flags=re.IGNORECASE)[-1].strip()
+                        date_part = _SHIPPING_BY_RE.split(tag_text)[-1].strip()
                         # Basic cleanup (remove leading/trailing non-alphanumeric, keeping spaces/hyphens needed for date)
-                        date_part = re.sub(r'^[^\w\d]+|[^\w\d]+$', '', date_part).strip()
+                        date_part = _SHIPPING_EDGE_PUNCT_RE.sub('', date_part).strip()
                         if date_part:
                             print(f"DEBUG Shipping: Attempt 3 - Found date string via broader fallback: '{date_part}'") # DEBUG
                             est_delivery_days = calculate_days_until_delivery(date_part)
@@ -278,15 +461,17 @@ def parse_etsy_html_content(html_content):
                  # print("DEBUG Shipping: Delivery date pattern not found with any method.") # DEBUG - Redundant
 
         # --- Shipping Cost --- 
+        # Walk the section's text nodes once; both the cost and free-delivery searches scan this list
+        shipping_strings = list(_iter_strings(shipping_section))
         # Find any element containing \"Delivery cost:\" (case-insensitive)
-        cost_element = shipping_section.find(string=re.compile(r'delivery cost:', re.IGNORECASE))
-        if cost_element:
-            # Try to find the parent element that likely contains the price nearby
+        cost_match_info = _find_string(shipping_strings, _DELIVERY_COST_RE.search)
+        if cost_match_info:
+            cost_element, target_text_container = cost_match_info
+            # Try the element that contains the text; the price is usually in there too
             # Navigating up one or two levels might be necessary depending on structure
-            target_text_container = cost_element.parent 
-            if target_text_container:
-                 full_text = target_text_container.get_text(strip=True)
-                 cost_match = re.search(r'[\£\$](\d+\.?\d*)', full_text)
+            if target_text_container is not None:
+                 full_text = _element_text(target_text_container)
+                 cost_match = _COST_AMOUNT_RE.search(full_text)
                  if cost_match:
                      try:
                          shipping_cost_str = str(float(cost_match.group(1)))
@@ -295,7 +480,7 @@ def parse_etsy_html_content(html_content):
             # Fallback if parent didn't work, try cost_element itself
             if not shipping_cost_str:
                 full_text = cost_element.strip() # Use the element text directly
-                cost_match = re.search(r'[\£\$](\d+\.?\d*)', full_text)
+                cost_match = _COST_AMOUNT_RE.search(full_text)
                 if cost_match:
                      try:
                          shipping_cost_str = str(float(cost_match.group(1)))
@@ -304,7 +489,7 @@ def parse_etsy_html_content(html_content):
                          
         # --- Check for Free Delivery if no cost found --- 
         if not shipping_cost_str:
-            free_delivery_element = shipping_section.find(string=re.compile(r'free delivery|free shipping', re.IGNORECASE))
+            free_delivery_element = _find_string(shipping_strings, _FREE_DELIVERY_RE.search)
             if free_delivery_element:
                 shipping_cost_str = "0.0" # Set cost to 0 if free delivery text found
                 print("DEBUG Shipping: Found 'Free Delivery' text.") # DEBUG
@@ -321,7 +506,49 @@ def parse_etsy_html_content(html_content):
 
     return data
 
+# --- Everbee Parsing Patterns (compiled once, not per line) ---
+_EVERBEE_END_MARKER_RE = re.compile('|'.join(f'(?:{kw})' for kw in (r"^Showing: \\d+ of \\d+$", r"^Listing Details$", r"^Tags$", r"^Related Searches$", r"^Keyword Score$", r"^Trends$")), re.IGNORECASE) # Combined end markers, one alternation (one match call per line)
+_EVERBEE_CURRENCY_STRIP = str.maketrans('', '', '\\$£€,') # Currency symbols, thousands separators (and backslashes)
+# First characters treated as "looks like a price/number" by the title/shop heuristic.
+# Mirrors the parser's long-standing r'^[\\$\£€\\d]' check, whose doubled escapes match
+# backslash, $, £, € and a literal 'd' rather than digits.
+_EVERBEE_DATA_START_CHARS = frozenset('\\$£€d')
+_ASCII_LETTERS = frozenset(string.ascii_letters)
+_EVERBEE_AGE_RE = re.compile(r'^(\d+\s+(?:Mo\.?|months?))$', re.IGNORECASE)
+_EVERBEE_PRICE_RE = re.compile(r'^[$£€][\d,.]+$')
+_EVERBEE_COUNT_RE = re.compile(r'^([\d,]+)$')
+_EVERBEE_RATE_RE = re.compile(r'^[\d.]+%?$')
+_EVERBEE_PERCENT_RE = re.compile(r'^\d+%?$')
+_EVERBEE_NON_EMPTY_RE = re.compile(r'.+')
+_EVERBEE_LISTING_TYPE_RE = re.compile(r'^(Physical|Digital)$', re.IGNORECASE)
+_EVERBEE_SECTION_HEADERS = ('trends', 'keyword score', 'tags', 'more details') # Lowercase; lines are pre-stripped
+_EVERBEE_TAG_COLUMN_HEADERS = frozenset(['volume', 'competition', 'keyword score']) # Header rows above the tag block (lowercase)
+_EVERBEE_TAG_DISPLAY_COLUMNS = ['name', 'volume', 'competition', 'score', 'level'] # Every parsed tag dict carries all five keys
+_EVERBEE_LEVELS = frozenset(['high', 'medium', 'low']) # Tag competition levels, matched on the lowercased line
+_EVERBEE_SCORE_RE = re.compile(r'^([\d,.]+)$')
+_EVERBEE_DETAIL_KEYS = ["When Made", "Listing Type", "Customizable", "Craft Supply", "Personalized", "Auto Renew", "Has variations", "Placements of Listing Shops", "Title character count", "# of tags", "Who Made"]
+_EVERBEE_DETAIL_KEYS_LOWER = {key.lower(): key for key in _EVERBEE_DETAIL_KEYS} # Lowercased line -> canonical key
+
+# Tag block line categories: a tag entry is Name, Volume, Competition, [Level], Score
+_TAG_LINE_OTHER, _TAG_LINE_NAME, _TAG_LINE_COUNT, _TAG_LINE_LEVEL, _TAG_LINE_SCORE = range(5)
+
+def _classify_tag_line(line):
+    """Category code for one tag-block line. COUNT lines (digits/commas) are also valid scores."""
+    if not _ASCII_LETTERS.isdisjoint(line):
+        # Lines with letters can't be numeric; level words are the only non-name case
+        return _TAG_LINE_LEVEL if line.lower() in _EVERBEE_LEVELS else _TAG_LINE_NAME
+    if _EVERBEE_SCORE_RE.match(line):
+        return _TAG_LINE_SCORE if '.' in line else _TAG_LINE_COUNT
+    return _TAG_LINE_OTHER
+
+def _strip_trailing_count(value):
+    """Drops a trailing whitespace-separated number ('I did 3' -> 'I did'); value is already stripped."""
+    parts = value.rsplit(None, 1)
+    return parts[0] if len(parts) == 2 and parts[1].isdecimal() else value
+
+@st.cache_data(show_spinner=False, max_entries=64)
 def parse_everbee_text_content(page_text):
+    """Parses pasted Everbee page text into opportunity fields; None if there is no text to parse (the caller reports it)."""
     # --- Initial Setup ---
     parsed_data = {}
     notes = []
@@ -331,20 +558,25 @@ def parse_everbee_text_content(page_text):
     # ... (existing normalization and splitting logic remains) ...
     try:
         normalized_text = page_text.replace('\\\\n', '\\n') # Replace literal \\n
-        lines_unfiltered = normalized_text.splitlines()
-        lines = [line.strip() for line in lines_unfiltered if line.strip()]
+        # Strip each line once and drop the blank ones (C-level splitlines/map/filter, no per-line re-strip)
+        lines = list(filter(None, map(str.strip, normalized_text.splitlines())))
+        lower_lines = [line.lower() for line in lines] # Lowercased once for every case-insensitive comparison below
         num_lines = len(lines)
         print(f"DEBUG Everbee: Processed {num_lines} non-empty lines.")
         if not lines:
-            st.error("Error parsing Everbee text: No content found after splitting lines.")
             print("ERROR Everbee: No non-empty lines found after splitting.")
             return None
     except Exception as e:
-        st.error(f"Error during robust line splitting: {e}")
         print(f"ERROR Everbee: Exception during robust line splitting: {e}")
         return None
     # --- END Normalize & Split ---
 
+    # --- Index Section Headers (one pass; reused by Trends, Tags and More Details) ---
+    section_header_positions = {header: [] for header in _EVERBEE_SECTION_HEADERS}
+    for j, line_lower in enumerate(lower_lines):
+        header_positions = section_header_positions.get(line_lower)
+        if header_positions is not None: header_positions.append(j)
+
     # --- Define Helper Functions (Keep) ---
     # ... (safe_int, safe_float functions remain) ...
     def safe_int(val_str): 
@@ -356,7 +588,7 @@ def parse_everbee_text_content(page_text):
     def safe_float(val_str, field_name="value"):
         if not val_str: return None
         try:
-            cleaned = re.sub(r'[\\$\\£€,]', '', str(val_str)).strip()
+            cleaned = str(val_str).translate(_EVERBEE_CURRENCY_STRIP).strip()
             return float(cleaned)
         except (ValueError, TypeError): return None
 
@@ -367,7 +599,6 @@ def parse_everbee_text_content(page_text):
     header_line_index = -1
     start_keywords = ["Customize button in Toolbar", "Filter button in Toolbar", "Export button in Toolbar"]
     header_keyword = "Product"
-    end_keywords_regex = [r"^Showing: \\d+ of \\d+$", r"^Listing Details$", r"^Tags$", r"^Related Searches$", r"^Keyword Score$", r"^Trends$"] # Combined end markers
 
     # Try finding button markers first
     button_marker_index = -1
@@ -377,7 +608,7 @@ def parse_everbee_text_content(page_text):
             print(f"DEBUG Everbee Boundaries: Found button marker near line {i}: '{line}'")
             # Look for "Product" header shortly after
             for j in range(i + 1, min(i + 10, num_lines)):
-                if lines[j].strip() == header_keyword:
+                if lines[j] == header_keyword:
                     header_line_index = j
                     table_start_index = header_line_index + 1 # Start after header
                     print(f"DEBUG Everbee Boundaries: Found '{header_keyword}' header at index {header_line_index}. Tentative start index: {table_start_index}")
@@ -387,7 +618,7 @@ def parse_everbee_text_content(page_text):
     # Fallback: Look for "Product" header anywhere early if button method failed
     if table_start_index == -1:
         for i in range(min(60, num_lines)): # Broader search
-            if lines[i].strip() == header_keyword:
+            if lines[i] == header_keyword:
                 header_line_index = i
                 table_start_index = header_line_index + 1
                 print(f"DEBUG Everbee Boundaries: Found '{header_keyword}' header via fallback at index {i}. Tentative start index: {table_start_index}")
@@ -399,7 +630,7 @@ def parse_everbee_text_content(page_text):
 
     # Find the first occurrence of any end marker *after* the potential start
     for i in range(table_start_index, num_lines):
-        if any(re.match(kw, lines[i], re.IGNORECASE) for kw in end_keywords_regex):
+        if _EVERBEE_END_MARKER_RE.match(lines[i]):
             table_end_index = i
             print(f"DEBUG Everbee Boundaries: Found potential end marker '{lines[i]}' at line {i}. Tentative table end index.")
             break
@@ -418,7 +649,7 @@ def parse_everbee_text_content(page_text):
     if heuristic_start_line < num_lines:
         line1 = lines[heuristic_start_line]
         # Simple check: not starting like a price/number and has letters
-        if not re.match(r'^[\\$\£€\\d]', line1) and re.search(r'[a-zA-Z]', line1) and line1 != "Product/Shop Image":
+        if line1[0] not in _EVERBEE_DATA_START_CHARS and not _ASCII_LETTERS.isdisjoint(line1) and line1 != "Product/Shop Image":
             # product_title_heuristic = line1 # <<< COMMENTED OUT
             # print(f"DEBUG Everbee Heuristic: Tentative Product Title: '{product_title_heuristic}' (from line {heuristic_start_line})") # <<< COMMENTED OUT
             lines_processed_heuristic += 1 # Ensure this is aligned with comments above
@@ -428,7 +659,7 @@ def parse_everbee_text_content(page_text):
             if next_line_idx < num_lines:
                 line2 = lines[next_line_idx]
                 # Check if it's NOT a price/number/age/etc.
-                if not re.match(r'^[\\$\£€\\d]', line2) and not re.match(r'^\d+\s+(Mo\.?|months?)$', line2, re.IGNORECASE) and re.search(r'[a-zA-Z]', line2):
+                if line2[0] not in _EVERBEE_DATA_START_CHARS and not _EVERBEE_AGE_RE.match(line2) and not _ASCII_LETTERS.isdisjoint(line2):
                     shop_name_heuristic = line2
                     print(f"DEBUG Everbee Heuristic: Tentative Shop Name: '{shop_name_heuristic}' (from line {next_line_idx})")
                     lines_processed_heuristic += 1
@@ -452,25 +683,25 @@ def parse_everbee_text_content(page_text):
     # Key: Label text (lowercase for matching)
     # Value: (target_key_in_parsed_data, conversion_function or None, optional_validation_regex)
     label_map = {
-        "price": ("price_str", None, r'^[$£€][\d,.]+$'), # Corrected Price regex too
+        "price": ("price_str", None, _EVERBEE_PRICE_RE), # Corrected Price regex too
         "shop": ("shop_name", None, None), # Explicit shop label
-        "mo. sales": ("monthly_sales", safe_int, r'^[\d,]+$'),
-        "mo. revenue": ("monthly_revenue_str_display", None, r'^[$£€][\d,.]+$'), 
-        "total sales": ("total_sales", safe_int, r'^[\d,]+$'),
-        "listing age": ("listing_age", None, r'^\d+\s+(?:Mo\.?|months?)$'), # Keep raw string
-        "reviews": ("reviews", safe_int, r'^[\d,]+$'),
-        "views": ("views", safe_int, r'^[\d,]+$'),
-        "favorites": ("favorites", safe_int, r'^[\d,]+$'),
-        "mo. reviews": ("monthly_reviews", safe_int, r'^[\d,]+$'), # Often under "Listing Details"
-        "conversion rate": ("conversion_rate", None, r'^[\d.]+%?$'), # Store raw, strip % later if needed
-        "category": ("category", None, r'.+'), # Any non-empty
-        "visibility score": ("visibility_score", None, r'^\d+%?$'), # Store raw, strip % later if needed
-        "review ratio": ("review_ratio", None, r'^[\d.]+%?$'), # Often under "Listing Details"
+        "mo. sales": ("monthly_sales", safe_int, _EVERBEE_COUNT_RE),
+        "mo. revenue": ("monthly_revenue_str_display", None, _EVERBEE_PRICE_RE), 
+        "total sales": ("total_sales", safe_int, _EVERBEE_COUNT_RE),
+        "listing age": ("listing_age", None, _EVERBEE_AGE_RE), # Keep raw string
+        "reviews": ("reviews", safe_int, _EVERBEE_COUNT_RE),
+        "views": ("views", safe_int, _EVERBEE_COUNT_RE),
+        "favorites": ("favorites", safe_int, _EVERBEE_COUNT_RE),
+        "mo. reviews": ("monthly_reviews", safe_int, _EVERBEE_COUNT_RE), # Often under "Listing Details"
+        "conversion rate": ("conversion_rate", None, _EVERBEE_RATE_RE), # Store raw, strip % later if needed
+        "category": ("category", None, _EVERBEE_NON_EMPTY_RE), # Any non-empty
+        "visibility score": ("visibility_score", None, _EVERBEE_PERCENT_RE), # Store raw, strip % later if needed
+        "review ratio": ("review_ratio", None, _EVERBEE_RATE_RE), # Often under "Listing Details"
         # --- Screenshot specific labels ---
-        "shop age": ("shop_age_overall", None, r'^\d+\s+(?:Mo\.?|months?)$'), # Get from table if possible
-        "total shop sales": ("total_shop_sales", safe_int, r'^[\d,]+$'),
-        "listing type": ("listing_type", None, r'^(Physical|Digital)$'),
-        "avg. reviews": ("monthly_reviews", safe_int, r'^[\d,]+$') # Map screenshot "Avg. Reviews" to monthly_reviews
+        "shop age": ("shop_age_overall", None, _EVERBEE_AGE_RE), # Get from table if possible
+        "total shop sales": ("total_shop_sales", safe_int, _EVERBEE_COUNT_RE),
+        "listing type": ("listing_type", None, _EVERBEE_LISTING_TYPE_RE),
+        "avg. reviews": ("monthly_reviews", safe_int, _EVERBEE_COUNT_RE) # Map screenshot "Avg. Reviews" to monthly_reviews
     }
 
     # Start loop *after* heuristic lines, but respect potential boundaries
@@ -481,9 +712,7 @@ def parse_everbee_text_content(page_text):
     i = parse_loop_start_index
     while i < num_lines:
         current_line = lines[i]
-        current_line_lower = current_line.lower() # Match labels case-insensitively
-        matched_label_info = None
-        label_text_matched = None
+        current_line_lower = lower_lines[i] # Match labels case-insensitively
 
         # Skip known noise explicitly first
         if current_line == "Dots Svg":
@@ -491,12 +720,9 @@ def parse_everbee_text_content(page_text):
             i += 1
             continue
 
-        # Check if the current line IS a label
-        for label, info in label_map.items():
-            if current_line_lower == label:
-                matched_label_info = info
-                label_text_matched = label
-                break
+        # Check if the current line IS a label (one dict lookup rather than comparing every label)
+        matched_label_info = label_map.get(current_line_lower)
+        label_text_matched = current_line_lower if matched_label_info else None
 
         if matched_label_info:
             target_key, conversion_func, validation_regex = matched_label_info
@@ -512,8 +738,8 @@ def parse_everbee_text_content(page_text):
                 print(f"DEBUG Everbee Label Match:   -> Potential value: '{raw_value}' (from line {value_line_index})")
 
                 # Validate value if regex provided
-                if validation_regex and not re.match(validation_regex, raw_value, re.IGNORECASE):
-                    print(f"WARNING Everbee Label Match:   -> Value '{raw_value}' failed validation regex: {validation_regex}. Skipping assignment.")
+                if validation_regex and not validation_regex.match(raw_value):
+                    print(f"WARNING Everbee Label Match:   -> Value '{raw_value}' failed validation regex: {validation_regex.pattern}. Skipping assignment.")
                     raw_value = None # Invalidate value
                     lines_to_skip = 1 # Only skip the label line if value is bad/missing
 
@@ -581,14 +807,13 @@ def parse_everbee_text_content(page_text):
     # ... (Existing robust Trends search logic remains) ...
     trends_search_start_index = -1 
     trends_search_end_index = num_lines 
-    for j, line in enumerate(lines): # Renamed loop variable
-        if line.strip().lower() == 'trends':
-             trends_search_start_index = j + 1 
-             print(f"DEBUG Everbee Trends: Found 'Trends' header at line {j}.")
-             break
+    if section_header_positions['trends']:
+        j = section_header_positions['trends'][0]
+        trends_search_start_index = j + 1
+        print(f"DEBUG Everbee Trends: Found 'Trends' header at line {j}.")
     if trends_search_start_index != -1:
         for j in range(trends_search_start_index, num_lines): # Renamed loop variable
-            line_lower = lines[j].strip().lower()
+            line_lower = lower_lines[j]
             if line_lower in ['tags', 'more details', 'related searches', 'listing details']: # Added listing details as end marker too
                 trends_search_end_index = j
                 print(f"DEBUG Everbee Trends: Found end marker '{line_lower}' at line {j}.")
@@ -597,17 +822,17 @@ def parse_everbee_text_content(page_text):
         last_30_sales_value_str = None
         # ... (Inner logic to find 'sales', number, 'revenue' sequence remains the same) ...
         for k in range(trends_search_start_index, trends_search_end_index): # Renamed loop variable
-            line_lower = lines[k].strip().lower()
+            line_lower = lower_lines[k]
             if line_lower == 'sales':
                  potential_sales_line_idx = -1; potential_sales_val = None; revenue_found_nearby = False
                  for l in range(k + 1, min(k + 4, trends_search_end_index)): # Renamed loop variable
-                     line_to_check = lines[l].strip()
-                     sales_val_match = re.match(r'^([\d,]+)$', line_to_check) # Accept commas too
+                     line_to_check = lines[l]
+                     sales_val_match = _EVERBEE_COUNT_RE.match(line_to_check) # Accept commas too
                      if sales_val_match: potential_sales_val = sales_val_match.group(1); potential_sales_line_idx = l; break
-                     elif line_to_check.lower() == 'revenue': potential_sales_val = None; break
+                     elif lower_lines[l] == 'revenue': potential_sales_val = None; break
                  if potential_sales_val is not None and potential_sales_line_idx != -1:
                      for m in range(potential_sales_line_idx + 1, min(potential_sales_line_idx + 4, trends_search_end_index)): # Renamed loop variable
-                         if lines[m].strip().lower() == 'revenue': revenue_found_nearby = True; break
+                         if lower_lines[m] == 'revenue': revenue_found_nearby = True; break
                  if potential_sales_val is not None and revenue_found_nearby:
                      last_30_sales_value_str = potential_sales_val
                      print(f"DEBUG Everbee Trends: ===> CONFIRMED Last 30 Days Sales value: {last_30_sales_value_str} (near line {k}) <===") 
@@ -630,17 +855,10 @@ def parse_everbee_text_content(page_text):
         block_end_index = num_lines
         details_marker_index = -1
 
-        # Find Tags start/end
-        for j, line in enumerate(lines):  # Renamed loop variable
-            if re.match(r'^Keyword Score$', line, re.IGNORECASE):
-                block_start_index = j + 1
-                break
-
-        if block_start_index == -1:
-            for j, line in enumerate(lines):  # Renamed loop variable
-                if re.match(r'^Tags$', line, re.IGNORECASE):
-                    block_start_index = j + 1
-                    break
+        # Find Tags start/end ('Keyword Score' header preferred, 'Tags' as fallback)
+        start_positions = section_header_positions['keyword score'] or section_header_positions['tags']
+        if start_positions:
+            block_start_index = start_positions[0] + 1
 
         if block_start_index != -1:
             print(f"DEBUG Everbee Tags: Found start marker around line {block_start_index-1}")
@@ -648,17 +866,16 @@ def parse_everbee_text_content(page_text):
             # Skip possible header rows
             while (
                 block_start_index < num_lines
-                and re.match(r'^(Volume|Competition|Keyword Score)\s*$', lines[block_start_index], re.IGNORECASE)
+                and lower_lines[block_start_index] in _EVERBEE_TAG_COLUMN_HEADERS
             ):
                 block_start_index += 1
 
-            # Find the end marker
-            for k in range(block_start_index, num_lines):  # Renamed loop variable
-                if re.match(r'^\s*More Details\s*$', lines[k], re.IGNORECASE):
-                    block_end_index = k
-                    details_marker_index = k
-                    print(f"DEBUG Everbee Tags: Found end marker at line {k}")
-                    break
+            # Find the end marker (first 'More Details' at or after the block start)
+            k = next((k for k in section_header_positions['more details'] if k >= block_start_index), None)
+            if k is not None:
+                block_end_index = k
+                details_marker_index = k
+                print(f"DEBUG Everbee Tags: Found end marker at line {k}")
 
             if block_start_index < block_end_index:
                 # ... (Inner loop processing tag_block_lines remains the same) ...
@@ -666,91 +883,43 @@ def parse_everbee_text_content(page_text):
                 num_tag_lines = len(tag_block_lines)
                 print(f"DEBUG Everbee Tags: Processing {num_tag_lines} lines in tag block.")
 
+                # Classify each line once; the scan below may revisit a line several times after a misalignment
+                tag_line_codes = [_classify_tag_line(line) for line in tag_block_lines]
+
                 k = 0  # Renamed loop variable
                 while k < num_tag_lines:
-                    current_tag = {}
-                    lines_consumed = 0
-
-                    try:
-                        # 1. Tag Name
-                        if k < num_tag_lines:
-                            line1 = tag_block_lines[k]
-                            if (
-                                line1
-                                and re.search(r'[a-zA-Z]', line1)
-                                and not re.match(r'^[\d,\.\s%]+$', line1)
-                                and not re.match(r'^(High|Medium|Low)$', line1, re.IGNORECASE)
-                            ):
-                                current_tag['name'] = line1
-                                lines_consumed += 1
-                            else:
-                                k += 1
-                                continue  # Skip to next line if name pattern fails
-                        else:
-                            break  # End of block
-
-                        # 2. Volume
-                        vol_idx = k + lines_consumed
-                        if vol_idx < num_tag_lines:
-                            line2 = tag_block_lines[vol_idx]
-                            vol_match = re.match(r'^([\d,]+)$', line2)
-                            if vol_match:
-                                current_tag['volume'] = vol_match.group(1)
-                                lines_consumed += 1
-                            else:
-                                k += 1
-                                continue  # Skip to next line if volume pattern fails
-                        else:
-                            break  # End of block
-
-                        # 3. Competition
-                        comp_idx = k + lines_consumed
-                        if comp_idx < num_tag_lines:
-                            line3 = tag_block_lines[comp_idx]
-                            comp_match = re.match(r'^([\d,]+)$', line3)
-                            if comp_match:
-                                current_tag['competition'] = comp_match.group(1)
-                                lines_consumed += 1
-                            else:
-                                k += 1
-                                continue  # Skip to next line if competition pattern fails
-                        else:
-                            break  # End of block
-
-                        # 4. Level (Optional)
-                        level_idx = k + lines_consumed
-                        current_tag['level'] = 'N/A'  # Default
-                        if level_idx < num_tag_lines:
-                            line4 = tag_block_lines[level_idx]
-                            level_match = re.match(r'^(High|Medium|Low)$', line4, re.IGNORECASE)
-                            if level_match:
-                                current_tag['level'] = level_match.group(1)
-                                lines_consumed += 1
-                        # Level is optional
-
-                        # 5. Score
-                        score_idx = k + lines_consumed
-                        if score_idx < num_tag_lines:
-                            line5 = tag_block_lines[score_idx]
-                            # Correct the regex: Remove trailing $'
-                            score_match = re.match(r'^([\d,.]+)$', line5)
-                            if score_match:
-                                current_tag['score'] = score_match.group(1)
-                                lines_consumed += 1
-                                tags_list.append(current_tag)
-                                k += lines_consumed # Advance past the full tag entry
-                                continue # Move to the next potential tag entry
-                            else:
-                                # Score missing – assume misalignment, advance one line
-                                k += 1
-                                continue
-                        else:
-                            break  # End of block
-
-                    except Exception as tag_loop_e:
-                        print(f"ERROR Everbee Tags Loop: {tag_loop_e} at index {k}")
+                    # 1. Tag Name
+                    if tag_line_codes[k] != _TAG_LINE_NAME:
+                        k += 1
+                        continue  # Skip to next line if name pattern fails
+                    # 2. Volume, 3. Competition
+                    comp_idx = k + 2
+                    if comp_idx >= num_tag_lines:
+                        break  # End of block
+                    if tag_line_codes[k + 1] != _TAG_LINE_COUNT or tag_line_codes[comp_idx] != _TAG_LINE_COUNT:
+                        k += 1
+                        continue  # Skip to next line if volume/competition pattern fails
+                    current_tag = {
+                        'name': tag_block_lines[k],
+                        'volume': tag_block_lines[k + 1],
+                        'competition': tag_block_lines[comp_idx],
+                        'level': 'N/A'  # Default
+                    }
+                    # 4. Level (Optional)
+                    score_idx = comp_idx + 1
+                    if score_idx < num_tag_lines and tag_line_codes[score_idx] == _TAG_LINE_LEVEL:
+                        current_tag['level'] = tag_block_lines[score_idx]
+                        score_idx += 1
+                    # 5. Score
+                    if score_idx >= num_tag_lines:
+                        break  # End of block
+                    if tag_line_codes[score_idx] in (_TAG_LINE_COUNT, _TAG_LINE_SCORE):
+                        current_tag['score'] = tag_block_lines[score_idx]
+                        tags_list.append(current_tag)
+                        k = score_idx + 1 # Advance past the full tag entry
+                    else:
+                        # Score missing – assume misalignment, advance one line
                         k += 1
-                        continue
                 # End while tag lines
 
                 if tags_list:
@@ -769,45 +938,31 @@ def parse_everbee_text_content(page_text):
     # ... (Existing More Details parsing logic remains the same) ...
     # Uses details_marker_index from Tags section if found, otherwise searches again
     details_start_index = details_marker_index + 1 if details_marker_index != -1 and details_marker_index + 1 < num_lines else -1
-    if details_start_index == -1: # Fallback search
-        for j, line in enumerate(lines): # Renamed loop variable
-             if re.match(r'^\s*More Details\s*$', line, re.IGNORECASE): details_start_index = j + 1; print(f"DEBUG Everbee Details: Found header via fallback at line {j}"); break
+    if details_start_index == -1 and section_header_positions['more details']: # Fallback search
+        j = section_header_positions['more details'][0]
+        details_start_index = j + 1; print(f"DEBUG Everbee Details: Found header via fallback at line {j}")
     if details_start_index != -1 and details_start_index < num_lines:
         details_list = []
-        known_keys = ["When Made", "Listing Type", "Customizable", "Craft Supply", "Personalized", "Auto Renew", "Has variations", "Placements of Listing Shops", "Title character count", "# of tags", "Who Made"]
-        key_regex_map = {key: re.compile(r'^\s*' + re.escape(key) + r'\s*$', re.IGNORECASE) for key in known_keys}
+        def flush_detail(key, value_lines, where=""):
+            """Records one finished key/value pair (Who Made count scrub, listing type fallback)."""
+            value = ' '.join(value_lines) # Lines are already stripped and non-empty
+            if key == 'Who Made': value = _strip_trailing_count(value)
+            details_list.append({'key': key, 'value': value or 'Unknown'})
+            # Assign listing type ONLY IF NOT ALREADY FOUND
+            if key == 'Listing Type' and 'listing_type' not in parsed_data:
+                 parsed_data['listing_type'] = value or 'Unknown'
+                 print(f"DEBUG Everbee Details Assign: Assigned listing_type='{parsed_data['listing_type']}' from Details section{where}.")
         current_key = None; current_value_lines = []
         print(f"DEBUG Everbee Details: Processing details from line {details_start_index}...")
         for j in range(details_start_index, num_lines): # Renamed loop variable
-            line = lines[j].strip()
-            if not line:
-                continue
-            # Ensure initialization happens at the start of each outer loop iteration
-            is_known_key = False 
-            matched_key = None
-            for key, key_regex in key_regex_map.items():
-                if key_regex.match(line):
-                    is_known_key = True
-                    matched_key = key
-                    break
-            if is_known_key:
-                if current_key and current_value_lines:
-                    value = ' '.join(current_value_lines).strip()
-                    if current_key == 'Who Made' and isinstance(value, str): value = re.sub(r'\s+\d+$', '', value).strip()
-                    details_list.append({'key': current_key, 'value': value or 'Unknown'})
-                    # Assign listing type ONLY IF NOT ALREADY FOUND
-                    if current_key == 'Listing Type' and 'listing_type' not in parsed_data:
-                         parsed_data['listing_type'] = value or 'Unknown'
-                         print(f"DEBUG Everbee Details Assign: Assigned listing_type='{parsed_data['listing_type']}' from Details section.")
+            # Known keys are whole-line, case-insensitive literals: one dict lookup instead of a regex per key
+            matched_key = _EVERBEE_DETAIL_KEYS_LOWER.get(lower_lines[j])
+            if matched_key:
+                if current_key and current_value_lines: flush_detail(current_key, current_value_lines)
                 current_key = matched_key; current_value_lines = []
-            elif current_key: current_value_lines.append(line)
+            elif current_key: current_value_lines.append(lines[j])
         if current_key and current_value_lines: # Process last key
-            value = ' '.join(current_value_lines).strip()
-            if current_key == 'Who Made' and isinstance(value, str): value = re.sub(r'\s+\d+$', '', value).strip()
-            details_list.append({'key': current_key, 'value': value or 'Unknown'})
-            if current_key == 'Listing Type' and 'listing_type' not in parsed_data:
-                 parsed_data['listing_type'] = value or 'Unknown'
-                 print(f"DEBUG Everbee Details Assign: Assigned listing_type='{parsed_data['listing_type']}' from Details section (final key).")
+            flush_detail(current_key, current_value_lines, " (final key)")
         if details_list:
              notes.append("\\n--- Everbee More Details ---")
              for detail_dict in details_list: notes.append(f"- {detail_dict['key']}: {detail_dict['value']}")
@@ -822,9 +977,8 @@ def parse_everbee_text_content(page_text):
         print("\\nDEBUG Everbee Final Pass: Searching for Shop Age Overall fallback...")
         listing_age_val = parsed_data.get('listing_age') # Get listing age if found
         found_distinct_age = None
-        age_pattern = r'^(\d+\s+(?:Mo\.?|months?))$' # Regex for age
         for i, line in enumerate(lines):
-            age_match = re.match(age_pattern, line.strip(), re.IGNORECASE)
+            age_match = _EVERBEE_AGE_RE.match(line)
             if age_match:
                 potential_shop_age = age_match.group(1)
                 # Normalize for comparison (e.g., "12 months" vs "12 Mo.")
@@ -851,16 +1005,36 @@ def parse_everbee_text_content(page_text):
     return parsed_data
 
 # --- ERANK Analysis Helper Functions ---
+# One keyword row = 9 consecutive lines: Keyword, Date, Trend, "Char Count<ws>Tag Occurrences",
+# Avg Searches, Avg Clicks, Avg CTR, Etsy Competition, Google Searches.
+# Matched over the whole data section in a single finditer sweep (rows only start at line starts).
+_ERANK_ROW_RE = re.compile(
+    r'^(?P<keyword>(?=[^\n]*[a-zA-Z])[^\n]*)\n'  # Keyword (must contain a letter)
+    r'[^\n]*\n'                                    # Date (not used)
+    r'[^\n]*\n'                                    # Trend (not used)
+    r'\d+[^\S\n]+\d+\n'                             # Char Count <tab> Tag Occurrences
+    r'(?P<searches>[^\n]*)\n'
+    r'(?P<clicks>[^\n]*)\n'
+    r'(?P<ctr>[^\n]*)\n'
+    r'(?P<competition>[^\n]*)\n'
+    r'(?P<google>(?i:[\d,]+|N/A|Unknown))$',
+    re.MULTILINE
+)
+_ERANK_COUNTRY_RE = re.compile(r'\((.*?)\)')
+_ERANK_BELOW_RE = re.compile(r'< ?(\d+(\.\d+)?)') # '< 20' style thresholds in clean_erank_value()
+# Column names for the _ERANK_ROW_RE groups, in group order
+ERANK_RAW_COLUMNS = ['Keyword', 'Avg Searches', 'Avg Clicks', 'Avg CTR', 'Etsy Competition', 'Google Searches']
+
 def parse_erank_text_content(erank_text):
     """
     Parses pasted text content from the ERANK Keyword Tool page using a procedural,
     chunk-based approach.
     Extracts Keyword, Avg. Searches, Avg. Clicks, Avg. CTR, Etsy Competition,
     Google Searches, the Seed Keyword, and the Country Code.
-    Returns: tuple (seed_keyword, country_code, keywords_data_list) or (None, None, []) on failure.
+    Returns: tuple (seed_keyword, country_code, keywords_data_columns) where keywords_data_columns maps
+    each ERANK_RAW_COLUMNS name to a list of raw strings, or is {} when no keyword rows were found.
     """
     lines = [line.strip() for line in erank_text.strip().splitlines()] # Ensure lines are stripped
-    keywords_data = []
     extracted_seed_keyword = None
     extracted_country_code = None # <-- Initialize country code
     seed_keyword_line_index = -1
@@ -955,7 +1129,7 @@ def parse_erank_text_content(erank_text):
               break
               
          if line.strip().startswith(country_line_prefix):
-             match = re.search(r'\((.*?)\)', line) # Find text within parentheses
+             match = _ERANK_COUNTRY_RE.search(line) # Find text within parentheses
              if match and match.group(1):
                  extracted_country_code = match.group(1).strip()
                  print(f"DEBUG ERANK: Found country code '{extracted_country_code}' at line {i}")
@@ -982,7 +1156,7 @@ def parse_erank_text_content(erank_text):
              else:
                  print(f"DEBUG ERANK: Found '{exclude_marker}' but not enough lines after it.")
                  # Return seed/country if found, but empty list as no data possible
-                 return extracted_seed_keyword, extracted_country_code, []
+                 return extracted_seed_keyword, extracted_country_code, {}
 
     if data_start_index == -1:
         if exclude_marker_found:
@@ -990,7 +1164,7 @@ def parse_erank_text_content(erank_text):
         else:
              print(f"DEBUG ERANK: Data start marker ('{exclude_marker}') not found after seed keyword line.")
         # Return seed/country if found, but empty list as no data found
-        return extracted_seed_keyword, extracted_country_code, []
+        return extracted_seed_keyword, extracted_country_code, {}
 
     # --- 3. Find Data End Marker ---
     end_markers = ["Rows per page:", "Copyright ©"]
@@ -1003,58 +1177,13 @@ def parse_erank_text_content(erank_text):
          print(f"DEBUG ERANK: No explicit end marker found. Parsing until end of text.")
 
     # --- 4. Process Data Chunks (Expecting 9 lines per keyword) ---
-    # ... (chunk processing loop remains the same) ...
-    current_index = data_start_index
-    while current_index < data_end_index:
-        # Check if enough lines remain for a potential 9-line chunk
-        if current_index + 8 >= data_end_index:
-            break
+    # Invalid lines between chunks are skipped by the regex scan itself
+    data_section = '\n'.join(lines[data_start_index:data_end_index])
+    keyword_rows = _ERANK_ROW_RE.findall(data_section) # One tuple of group values per keyword
+    # Transpose rows into columns ({} when nothing matched)
+    keywords_data = dict(zip(ERANK_RAW_COLUMNS, map(list, zip(*keyword_rows))))
 
-        # --- Define the 9 lines for the current chunk ---
-        line1_kw = lines[current_index]       # Keyword
-        line2_date = lines[current_index + 1]   # Date (Not used anymore but part of structure)
-        line3_trend = lines[current_index + 2]  # Trend
-        line4_counts = lines[current_index + 3] # Char Count 	 Tag Occurrences
-        line5_search = lines[current_index + 4] # Avg Searches
-        line6_clicks = lines[current_index + 5] # Avg Clicks
-        line7_ctr = lines[current_index + 6]    # Avg CTR
-        line8_comp = lines[current_index + 7]   # Etsy Competition
-        line9_goog = lines[current_index + 8]   # Google Searches
-
-        # --- Basic Validation of Chunk Structure ---
-        is_likely_keyword = bool(re.search(r'[a-zA-Z]', line1_kw)) and not line1_kw.replace(' ', '').isdigit()
-        has_tab_in_line4 = '\t' in line4_counts # Check for literal tab character
-        # More robust check for line 4 format like '18	26'
-        counts_match = re.match(r'^\d+\s+\d+$', line4_counts)
-        is_likely_google = bool(re.match(r'^([\d,]+|N/A|Unknown)$', line9_goog, re.IGNORECASE))
-
-        if is_likely_keyword and counts_match and is_likely_google:
-            try:
-                keyword_entry = {
-                    'Keyword': line1_kw,
-                    'Avg Searches': line5_search,
-                    'Avg Clicks': line6_clicks,
-                    'Avg CTR': line7_ctr,
-                    'Etsy Competition': line8_comp,
-                    'Google Searches': line9_goog
-                }
-                keywords_data.append(keyword_entry)
-                current_index += 9 # Move to the next potential chunk
-            except Exception as e:
-                print(f"DEBUG ERANK Chunk: ERROR extracting data from valid-looking chunk at index {current_index}: {e}")
-                current_index += 1
-                while current_index < data_end_index and not lines[current_index]: current_index += 1
-        else:
-            # Debugging invalid structure detection
-            # print(f"DEBUG ERANK Chunk: Invalid structure detected at index {current_index}. Skipping line.")
-            # print(f"  L1 Kw: '{line1_kw}' (Likely:{is_likely_keyword})")
-            # print(f"  L4 Cts: '{line4_counts}' (Tab:{has_tab_in_line4}, Match:{bool(counts_match)})")
-            # print(f"  L9 Goog: '{line9_goog}' (Likely:{is_likely_google})")
-            current_index += 1
-            while current_index < data_end_index and not lines[current_index]: current_index += 1
-
-
-    print(f"\nERANK Summary: Parsing loop finished. Extracted {len(keywords_data)} keyword entries.")
+    print(f"\nERANK Summary: Parsing loop finished. Extracted {len(keyword_rows)} keyword entries.")
     return extracted_seed_keyword, extracted_country_code, keywords_data # <-- Return country code
 
 def clean_erank_value(val_str):
@@ -1062,7 +1191,7 @@ def clean_erank_value(val_str):
     val_str = str(val_str).strip().lower().replace(',', '')
     if 'unknown' in val_str or 'n/a' in val_str: return np.nan
     if '<' in val_str:
-        num_part = re.search(r'< ?(\d+(\.\d+)?)', val_str)
+        num_part = _ERANK_BELOW_RE.search(val_str)
         # Return slightly less than the threshold for '< X' values
         return float(num_part.group(1)) - 0.01 if num_part else 1.0 # Adjusted fallback
     val_str = val_str.replace('%', '')
@@ -1070,80 +1199,130 @@ def clean_erank_value(val_str):
     except ValueError: return np.nan
 
 # --- New Absolute Scoring Functions (Replacing Normalization) ---
-def score_searches(value):
-    if pd.isna(value): return 0.5 # Neutral for missing
-    if value < 50: return 0.1
-    if value < 250: return 0.3
-    if value < 1000: return 0.6
-    if value < 5000: return 0.8
-    return 1.0
-
-def score_ctr(value):
-    if pd.isna(value): return 0.5 # Neutral for missing
-    # Assumes value is a percentage e.g. 99.0
-    if value < 50: return 0.1
-    if value < 75: return 0.4
-    if value < 95: return 0.7
-    return 1.0
-
-def score_competition(value):
-    if pd.isna(value): return 0.5 # Neutral for missing
-    # Lower competition gets higher score
-    if value < 1000: return 1.0
-    if value < 20000: return 0.8
-    if value < 100000: return 0.5
-    if value < 500000: return 0.2
-    return 0.0 # >= 500k
-
-# --- Validation Helpers ---
-def validate_float(val_str, field_name):
-    if not val_str: return None, True
-    try: return float(str(val_str).replace(',', '').replace('$', '').replace('£', '').replace('€', '')), True
-    except ValueError: st.warning(f"Invalid {field_name} format."); return None, False
-
-def validate_int(val_str, field_name):
-    if not val_str: return None, True
-    try: return int(str(val_str).replace(',', '')), True
-    except ValueError: st.warning(f"Invalid {field_name} format."); return None, False
+# Bucket edges/scores for np.digitize: value < bins[0] -> scores[0], ..., value >= bins[-1] -> scores[-1]
+SEARCH_BINS = np.array([50, 250, 1000, 5000], dtype=np.float64)
+SEARCH_SCORES = np.array([0.1, 0.3, 0.6, 0.8, 1.0], dtype=np.float32)
+# Assumes value is a percentage e.g. 99.0
+CTR_BINS = np.array([50, 75, 95], dtype=np.float64)
+CTR_SCORES = np.array([0.1, 0.4, 0.7, 1.0], dtype=np.float32)
+# Lower competition gets higher score (>= 500k scores 0)
+COMPETITION_BINS = np.array([1000, 20000, 100000, 500000], dtype=np.float64)
+COMPETITION_SCORES = np.array([1.0, 0.8, 0.5, 0.2, 0.0], dtype=np.float32)
+MISSING_SCORE = np.float32(0.5) # Neutral for missing
+# Scores are small-range (weighted sum <= 3.0), so float32 is plenty and halves memory traffic
+
+def score_vec(num_col, bins, scores):
+    """Vectorized bucket scoring of a numeric column (NaN -> MISSING_SCORE). Returns float32."""
+    values = np.asarray(num_col, dtype=np.float64)
+    bucket_scores = scores[np.digitize(values, bins)]
+    return np.where(np.isnan(values), MISSING_SCORE, bucket_scores)
+
+def clean_erank_column(raw_col):
+    """Column version of clean_erank_value: cleans each distinct raw string once, then gathers by code."""
+    codes, uniques = pd.factorize(raw_col) # Missing values get code -1 -> trailing NaN
+    cleaned_uniques = np.array([clean_erank_value(v) for v in uniques] + [np.nan], dtype=np.float64)
+    return cleaned_uniques[codes]
+
+def add_erank_score_columns(df):
+    """Adds cleaned numeric (*_Num) and bucket score (*_Score) columns to an ERANK keywords DataFrame."""
+    df['Searches_Num'] = clean_erank_column(df['Avg Searches'])
+    df['CTR_Num'] = clean_erank_column(df['Avg CTR'])
+    df['Competition_Num'] = clean_erank_column(df['Etsy Competition'])
+    df['Searches_Score'] = score_vec(df['Searches_Num'], SEARCH_BINS, SEARCH_SCORES)
+    df['CTR_Score'] = score_vec(df['CTR_Num'], CTR_BINS, CTR_SCORES)
+    df['Competition_Score'] = score_vec(df['Competition_Num'], COMPETITION_BINS, COMPETITION_SCORES)
+    return df
+
+def opportunity_scores(df, w_searches, w_ctr, w_comp, score_matrix=None):
+    """Weighted sum of the three *_Score columns as one (N, 3) @ (3,) float32 product.
+    Pass a prebuilt score_matrix to skip gathering the columns from df."""
+    if score_matrix is None:
+        score_matrix = df[['Searches_Score', 'CTR_Score', 'Competition_Score']].to_numpy(dtype=np.float32)
+    return score_matrix @ np.array([w_searches, w_ctr, w_comp], dtype=np.float32)
+
+ERANK_NUM_COLUMNS = ['Searches_Num', 'CTR_Num', 'Competition_Num']
+ERANK_SCORE_COLUMNS = ['Searches_Score', 'CTR_Score', 'Competition_Score']
+ERANK_DERIVED_COLUMNS = ERANK_NUM_COLUMNS + ERANK_SCORE_COLUMNS
+
+@st.cache_data(show_spinner=False)
+def load_scored_erank_keywords():
+    """Fetches all saved ERANK keywords with weight-independent score columns.
+    Scores are precomputed at save time; rows saved before that are scored once here and backfilled.
+    Cached across reruns; call load_scored_erank_keywords.clear() after saving new keywords."""
+    all_keywords_df = db.get_all_erank_keywords()
+    if all_keywords_df.empty:
+        return all_keywords_df
+    all_keywords_df[ERANK_DERIVED_COLUMNS] = all_keywords_df[ERANK_DERIVED_COLUMNS].astype(np.float64)
+    missing_scores = all_keywords_df['Searches_Score'].isna() # Score columns are never NULL once computed
+    if missing_scores.any():
+        legacy_df = add_erank_score_columns(all_keywords_df.loc[missing_scores])
+        all_keywords_df.loc[missing_scores, ERANK_DERIVED_COLUMNS] = legacy_df[ERANK_DERIVED_COLUMNS]
+        backfill_rows = legacy_df[ERANK_DERIVED_COLUMNS].astype(np.float64).astype(object)
+        backfill_rows['keyword_id'] = legacy_df['keyword_id']
+        backfill_rows = backfill_rows.where(backfill_rows.notna(), None).itertuples(index=False, name=None)
+        db.update_erank_keyword_scores(list(backfill_rows))
+    all_keywords_df[ERANK_SCORE_COLUMNS] = all_keywords_df[ERANK_SCORE_COLUMNS].astype(np.float32)
+    # Only a handful of countries repeated across every row: store as small integer codes
+    all_keywords_df['Country'] = all_keywords_df['Country'].astype('category')
+    return all_keywords_df
+
+@st.cache_data(show_spinner=False)
+def global_erank_score_matrix():
+    """Contiguous (N, 3) float32 matrix of the saved keywords' *_Score columns.
+    Lets each new weight combination rank without reloading the full keyword frame."""
+    return np.ascontiguousarray(load_scored_erank_keywords()[ERANK_SCORE_COLUMNS].to_numpy(dtype=np.float32))
+
+@st.cache_data(show_spinner=False)
+def rank_global_erank_keywords(w_searches, w_ctr, w_comp):
+    """Opportunity scores and descending row order for load_scored_erank_keywords() at the given weights.
+    Memoized per weight combination; cleared together with the keyword cache after a save."""
+    scores = opportunity_scores(None, w_searches, w_ctr, w_comp, score_matrix=global_erank_score_matrix())
+    return scores, np.argsort(-scores, kind='stable')
 
 # --- Session State Initialization ---
+# === Opportunity Tracker Fields ===
+_SESSION_STRING_FIELDS = (
+    "product_title", "product_url", "shop_name", "shop_url",
+    "price_str", "processing_time", "est_revenue_str",
+    "est_sales_str", "shop_age", "niche_tags", "aliexpress_urls", "notes",
+    "pasted_html", "shipping_cost_str",
+    "total_sales_str", "views_str", "favorites_str", "conversion_rate",
+    "listing_age", "shop_age_overall", "category", "visibility_score",
+    "review_ratio", "monthly_reviews_str", "listing_type",
+    "last_30_days_sales_str", "last_30_days_revenue_str",
+    "pasted_everbee_text",
+    # Keys for opportunity form inputs to avoid conflicts
+    "opp_form_product_title", "opp_form_product_url", "opp_form_shop_name",
+    "opp_form_shop_url", "opp_form_price_str", "opp_form_processing_time",
+    "opp_form_shipping_cost_str", "opp_form_est_revenue_str", "opp_form_est_sales_str",
+    "opp_form_last_30_days_sales_str", "opp_form_last_30_days_revenue_str",
+    "opp_form_listing_age", "opp_form_shop_age_overall", "opp_form_category",
+    "opp_form_niche_tags", "opp_form_total_sales_str", "opp_form_views_str",
+    "opp_form_favorites_str", "opp_form_conversion_rate", "opp_form_listing_type",
+    "opp_form_aliexpress_urls", "opp_form_notes"
+)
+
+# Immutable defaults, safe to share between sessions (mutable ones are created per session below)
+_SESSION_DEFAULTS = {
+    **dict.fromkeys(_SESSION_STRING_FIELDS, ""),
+    "is_digital": False, # For opp form
+    # Which parsed sections are already in opp_form_notes (checked instead of searching the notes text)
+    "notes_has_description": False, "notes_has_review_dates": False, "notes_has_everbee": False,
+    "etsy_price_float": None, "delete_id_input": None,
+    "opportunity_rows_shown": _OPPORTUNITY_PAGE_ROWS,
+    "opportunity_filter_cache": None, # (filter term, filtered rows) from the last rerun
+    # === ERANK Analysis Fields ===
+    "pasted_erank_text": "", "erank_seed_keyword": "",
+    "w_searches": 0.4, "w_ctr": 0.3, "w_comp": 0.3,
+}
+
 def init_session_state():
-    # === Opportunity Tracker Fields ===
-    string_fields_opp = [
-        "product_title", "product_url", "shop_name", "shop_url",
-        "price_str", "processing_time", "est_revenue_str",
-        "est_sales_str", "shop_age", "niche_tags", "aliexpress_urls", "notes",
-        "pasted_html", "shipping_cost_str",
-        "total_sales_str", "views_str", "favorites_str", "conversion_rate",
-        "listing_age", "shop_age_overall", "category", "visibility_score",
-        "review_ratio", "monthly_reviews_str", "listing_type",
-        "last_30_days_sales_str", "last_30_days_revenue_str",
-        "pasted_everbee_text",
-        # Keys for opportunity form inputs to avoid conflicts
-        "opp_form_product_title", "opp_form_product_url", "opp_form_shop_name",
-        "opp_form_shop_url", "opp_form_price_str", "opp_form_processing_time",
-        "opp_form_shipping_cost_str", "opp_form_est_revenue_str", "opp_form_est_sales_str",
-        "opp_form_last_30_days_sales_str", "opp_form_last_30_days_revenue_str",
-        "opp_form_listing_age", "opp_form_shop_age_overall", "opp_form_category",
-        "opp_form_niche_tags", "opp_form_total_sales_str", "opp_form_views_str",
-        "opp_form_favorites_str", "opp_form_conversion_rate", "opp_form_listing_type",
-        "opp_form_aliexpress_urls", "opp_form_notes"
-    ]
-    for field in string_fields_opp:
-        if field not in st.session_state: st.session_state[field] = ""
-    if "is_digital" not in st.session_state: st.session_state["is_digital"] = False # For opp form
+    # Still runs every rerun: Streamlit drops the state of widgets that were not rendered, so keys must be restored
+    missing = {key: value for key, value in _SESSION_DEFAULTS.items() if key not in st.session_state}
+    if missing: st.session_state.update(missing)
     if 'tags_list' not in st.session_state: st.session_state['tags_list'] = [] # Everbee tags for current opp
-    if 'etsy_price_float' not in st.session_state: st.session_state['etsy_price_float'] = None
-    if 'delete_id_input' not in st.session_state: st.session_state['delete_id_input'] = None
-
-    # === ERANK Analysis Fields ===
-    if 'erank_keywords_list' not in st.session_state: st.session_state['erank_keywords_list'] = [] # Stores SCORED list for CURRENT session display
-    if 'raw_erank_data' not in st.session_state: st.session_state['raw_erank_data'] = [] # Stores RAW parsed list for SAVING
-    if 'pasted_erank_text' not in st.session_state: st.session_state['pasted_erank_text'] = ""
-    if 'erank_seed_keyword' not in st.session_state: st.session_state['erank_seed_keyword'] = ""
-    if 'w_searches' not in st.session_state: st.session_state['w_searches'] = 0.4
-    if 'w_ctr' not in st.session_state: st.session_state['w_ctr'] = 0.3
-    if 'w_comp' not in st.session_state: st.session_state['w_comp'] = 0.3
+    if 'erank_keywords_df' not in st.session_state: st.session_state['erank_keywords_df'] = pd.DataFrame() # Stores SCORED frame for CURRENT session display
+    if 'raw_erank_data' not in st.session_state: st.session_state['raw_erank_data'] = {} # Stores RAW parsed columns for SAVING
 
 init_session_state()
 
@@ -1177,6 +1356,8 @@ with tab1:
         st.session_state.is_digital = False
         st.session_state.tags_list = []
         st.session_state.etsy_price_float = None
+        st.session_state.notes_has_description = st.session_state.notes_has_review_dates = st.session_state.notes_has_everbee = False
+        st.session_state.last_everbee_title = None # A cleared form may reopen Everbee for the same product
         st.session_state.clear_form = False # Reset the flag
         print("DEBUG: Cleared form fields at start of run.")
 
@@ -1300,42 +1481,14 @@ Products must target $30+ price points.
         min_price_filter = st.number_input("Minimum Price (£)", min_value=0, value=25, step=1, key="opp_min_price_filter")
         keywords_input = st.text_area("Enter keywords (one per line):", height=150, placeholder="ceramic mug...", key="opp_kw_input")
         if keywords_input:
-            keywords = [kw.strip() for kw in keywords_input.split('\n') if kw.strip()]
+            keywords = list(filter(None, map(str.strip, keywords_input.splitlines()))) # One strip per line, blanks dropped
             st.subheader("Clickable Etsy Search Links (Best Sellers > £" + str(min_price_filter) + ")")
             urls_to_open = [generate_etsy_url(kw, min_price=min_price_filter) for kw in keywords]
             for i, kw in enumerate(keywords): st.markdown(f"- [{kw}]({urls_to_open[i]})", unsafe_allow_html=True)
             if st.button("🚀 Open All Links in New Tabs", key="open_etsy_tabs"):
-                count = 0
-                opened_incognito = 0
-                os_system = platform.system()
-                with st.spinner(f"Attempting to open {len(urls_to_open)} tabs (incognito if possible)..."):
-                    for url in urls_to_open:
-                        incognito_success = False
-                        try:
-                            cmd_args = []
-                            if os_system == "Darwin": # macOS
-                                cmd_args = ['open', '-na', 'Google Chrome', '--args', '--incognito', url]
-                            elif os_system == "Windows":
-                                cmd_args = ['chrome', '--incognito', url]
-                            elif os_system == "Linux":
-                                try:
-                                    cmd_args = ['google-chrome', '--incognito', url]
-                                    subprocess.run(['which', 'google-chrome'], check=True, capture_output=True)
-                                except (FileNotFoundError, subprocess.CalledProcessError):
-                                    cmd_args = ['chromium-browser', '--incognito', url]
-                            if cmd_args:
-                                result = subprocess.run(cmd_args, check=False, capture_output=True, text=True)
-                                if result.returncode == 0:
-                                    incognito_success = True; opened_incognito += 1
-                                else: print(f"Incognito command failed: {result.stderr}")
-                        except FileNotFoundError: print(f"Could not find browser command for incognito mode.")
-                        except Exception as e: print(f"Error running incognito command: {e}")
-                        if not incognito_success: # Fallback
-                            try: webbrowser.open_new_tab(url)
-                            except Exception as web_e: st.warning(f"Failed to open {url} in any browser: {web_e}"); continue
-                        count += 1; time.sleep(1)
-                if opened_incognito > 0: st.success(f"Opened {count} tabs. {opened_incognito} attempted in Chrome Incognito (check browser). Others opened in default browser.")
-                else: st.success(f"Opened {count} tabs in default browser (could not use Chrome Incognito). ")
+                # Hand the URLs to the background worker; the page stays responsive while tabs open
+                get_tab_queue().put(list(urls_to_open)) # One batch = one browser launch
+                st.success(f"Opening {len(urls_to_open)} tabs in the background (Chrome Incognito if available, otherwise the default browser).")
         # else: # Logic from provided code
         #     st.info("Enter some keywords above to generate Etsy search links.") # This seems unnecessary if input is empty
 
@@ -1351,44 +1504,51 @@ Products must target $30+ price points.
                 with st.spinner("Parsing HTML..."):
                     try:
                         parsed_data = parse_etsy_html_content(st.session_state.pasted_html)
+                        ss = st.session_state # Bound once for the form updates below
                         # Update session state FORM fields from parsed Etsy data
-                        st.session_state.opp_form_product_title = parsed_data.get('product_title', '')
-                        st.session_state.opp_form_product_url = parsed_data.get('product_url', '')
-                        st.session_state.opp_form_price_str = parsed_data.get('price_str', '')
-                        st.session_state.opp_form_shop_name = parsed_data.get('shop_name', '')
-                        st.session_state.opp_form_shop_url = parsed_data.get('shop_url', '')
-                        st.session_state.opp_form_processing_time = parsed_data.get('processing_time', '')
-                        st.session_state.opp_form_shipping_cost_str = parsed_data.get('shipping_cost_str', '')
+                        ss.opp_form_product_title = parsed_data.get('product_title', '')
+                        ss.opp_form_product_url = parsed_data.get('product_url', '')
+                        ss.opp_form_price_str = parsed_data.get('price_str', '')
+                        ss.opp_form_shop_name = parsed_data.get('shop_name', '')
+                        ss.opp_form_shop_url = parsed_data.get('shop_url', '')
+                        ss.opp_form_processing_time = parsed_data.get('processing_time', '')
+                        ss.opp_form_shipping_cost_str = parsed_data.get('shipping_cost_str', '')
                         # Update the float price for calculations
-                        if st.session_state.opp_form_price_str:
-                            try: st.session_state.etsy_price_float = float(re.sub(r'[^\d.]', '', st.session_state.opp_form_price_str))
-                            except ValueError: st.session_state.etsy_price_float = None
-                        else: st.session_state.etsy_price_float = None
+                        if ss.opp_form_price_str:
+                            try: ss.etsy_price_float = float(_NON_PRICE_CHARS_RE.sub('', ss.opp_form_price_str))
+                            except ValueError: ss.etsy_price_float = None
+                        else: ss.etsy_price_float = None
                         # Append notes to FORM notes field
                         notes_key = 'opp_form_notes'
-                        existing_notes = st.session_state.get(notes_key, "")
+                        existing_notes = ss.get(notes_key, "")
+                        if not existing_notes: # Notes emptied since the last parse: sections may be added again
+                            ss.notes_has_description = ss.notes_has_review_dates = ss.notes_has_everbee = False
                         desc = parsed_data.get('description_notes')
                         revs = parsed_data.get('review_dates_str')
-                        if desc and "--- Description ---" not in existing_notes: existing_notes += f"\n\n--- Description ---\n{desc}"
-                        if revs and "--- Review Dates ---" not in existing_notes: existing_notes += f"\n\n--- Review Dates (YYYY-MM-DD) ---\n{revs}"
-                        st.session_state[notes_key] = existing_notes.strip()
+                        notes_parts = [existing_notes] # Joined once below instead of re-copying the notes per section
+                        if desc and not ss.notes_has_description:
+                            notes_parts.append(f"--- Description ---\n{desc}"); ss.notes_has_description = True
+                        if revs and not ss.notes_has_review_dates:
+                            notes_parts.append(f"--- Review Dates (YYYY-MM-DD) ---\n{revs}"); ss.notes_has_review_dates = True
+                        ss[notes_key] = "\n\n".join(notes_parts).strip()
                         st.success("HTML Parsed and form fields updated!")
 
                         # --- Automatically open Everbee link ---
-                        product_title_for_everbee = st.session_state.opp_form_product_title
+                        product_title_for_everbee = ss.opp_form_product_title
                         if product_title_for_everbee:
-                            try:
-                                encoded_title = quote_plus(product_title_for_everbee)
-                                everbee_url = f"https://app.everbee.io/product-analytics?search_term={encoded_title}"
-                                webbrowser.open_new_tab(everbee_url)
-                                st.info(f"Opened Everbee Product Analytics search for: '{product_title_for_everbee}' in a new tab.")
+                            everbee_url = _EVERBEE_SEARCH_URL + quote_plus(product_title_for_everbee) # Built once for both paths
+                            if product_title_for_everbee == ss.get('last_everbee_title'): # Re-parse of the same product: tab already opened
                                 st.markdown(f"**Everbee Link:** [{everbee_url}]({everbee_url})")
-                                st.info("Please copy the TEXT from the Everbee page and paste it below.") # Corrected instruction
-                            except Exception as web_e:
-                                st.warning(f"Could not automatically open Everbee link: {web_e}")
-                                encoded_title = quote_plus(product_title_for_everbee)
-                                everbee_url = f"https://app.everbee.io/product-analytics?search_term={encoded_title}"
-                                st.markdown(f"**Manual Everbee Link:** [{everbee_url}]({everbee_url})")
+                            else:
+                                try:
+                                    webbrowser.open_new_tab(everbee_url)
+                                    ss.last_everbee_title = product_title_for_everbee
+                                    st.info(f"Opened Everbee Product Analytics search for: '{product_title_for_everbee}' in a new tab.")
+                                    st.markdown(f"**Everbee Link:** [{everbee_url}]({everbee_url})")
+                                    st.info("Please copy the TEXT from the Everbee page and paste it below.") # Corrected instruction
+                                except Exception as web_e:
+                                    st.warning(f"Could not automatically open Everbee link: {web_e}")
+                                    st.markdown(f"**Manual Everbee Link:** [{everbee_url}]({everbee_url})")
 
                     except Exception as e: st.error(f"Error parsing HTML: {e}"); st.exception(e)
             else: st.warning("Please paste HTML content.")
@@ -1404,62 +1564,65 @@ Products must target $30+ price points.
                     try:
                         parsed_data = parse_everbee_text_content(st.session_state.pasted_everbee_text)
                         if parsed_data:
+                            ss = st.session_state # Bound once for the form updates below
                             # Update relevant FORM fields in session state
-                            st.session_state.opp_form_product_title = parsed_data.get('product_title', st.session_state.get('opp_form_product_title',''))
-                            st.session_state.opp_form_shop_name = parsed_data.get('shop_name', st.session_state.get('opp_form_shop_name',''))
+                            ss.opp_form_product_title = parsed_data.get('product_title', ss.get('opp_form_product_title',''))
+                            ss.opp_form_shop_name = parsed_data.get('shop_name', ss.get('opp_form_shop_name',''))
 
                             # --- Debugging Area --- 
                             key_to_check = 'monthly_sales'
                             val_from_parsed = parsed_data.get(key_to_check, 'MISSING')
                             print(f"DEBUG State Assign: Before assign opp_form_est_sales_str: parsed_data['{key_to_check}'] = {repr(val_from_parsed)}")
-                            st.session_state.opp_form_est_sales_str = str(val_from_parsed) if val_from_parsed != 'MISSING' else ''
-                            print(f"DEBUG State Assign: After assign opp_form_est_sales_str: session_state value = {repr(st.session_state.opp_form_est_sales_str)}")
+                            ss.opp_form_est_sales_str = str(val_from_parsed) if val_from_parsed != 'MISSING' else ''
+                            print(f"DEBUG State Assign: After assign opp_form_est_sales_str: session_state value = {repr(ss.opp_form_est_sales_str)}")
 
                             key_to_check = 'total_sales'
                             val_from_parsed = parsed_data.get(key_to_check, 'MISSING')
                             print(f"DEBUG State Assign: Before assign opp_form_total_sales_str: parsed_data['{key_to_check}'] = {repr(val_from_parsed)}")
-                            st.session_state.opp_form_total_sales_str = str(val_from_parsed) if val_from_parsed != 'MISSING' else ''
-                            print(f"DEBUG State Assign: After assign opp_form_total_sales_str: session_state value = {repr(st.session_state.opp_form_total_sales_str)}")
+                            ss.opp_form_total_sales_str = str(val_from_parsed) if val_from_parsed != 'MISSING' else ''
+                            print(f"DEBUG State Assign: After assign opp_form_total_sales_str: session_state value = {repr(ss.opp_form_total_sales_str)}")
 
                             key_to_check = 'views'
                             val_from_parsed = parsed_data.get(key_to_check, 'MISSING')
                             print(f"DEBUG State Assign: Before assign opp_form_views_str: parsed_data['{key_to_check}'] = {repr(val_from_parsed)}")
-                            st.session_state.opp_form_views_str = str(val_from_parsed) if val_from_parsed != 'MISSING' else ''
-                            print(f"DEBUG State Assign: After assign opp_form_views_str: session_state value = {repr(st.session_state.opp_form_views_str)}")
+                            ss.opp_form_views_str = str(val_from_parsed) if val_from_parsed != 'MISSING' else ''
+                            print(f"DEBUG State Assign: After assign opp_form_views_str: session_state value = {repr(ss.opp_form_views_str)}")
 
                             key_to_check = 'favorites'
                             val_from_parsed = parsed_data.get(key_to_check, 'MISSING')
                             print(f"DEBUG State Assign: Before assign opp_form_favorites_str: parsed_data['{key_to_check}'] = {repr(val_from_parsed)}")
-                            st.session_state.opp_form_favorites_str = str(val_from_parsed) if val_from_parsed != 'MISSING' else ''
-                            print(f"DEBUG State Assign: After assign opp_form_favorites_str: session_state value = {repr(st.session_state.opp_form_favorites_str)}")
+                            ss.opp_form_favorites_str = str(val_from_parsed) if val_from_parsed != 'MISSING' else ''
+                            print(f"DEBUG State Assign: After assign opp_form_favorites_str: session_state value = {repr(ss.opp_form_favorites_str)}")
                             # --- End Debugging Area ---
 
-                            st.session_state.opp_form_est_revenue_str = parsed_data.get('monthly_revenue_str_display', str(parsed_data.get('monthly_revenue', '')))
-                            st.session_state.opp_form_conversion_rate = parsed_data.get('conversion_rate', st.session_state.get('opp_form_conversion_rate','')) # Correctly strips % in parser
-                            st.session_state.opp_form_listing_age = parsed_data.get('listing_age', st.session_state.get('opp_form_listing_age',''))
-                            st.session_state.opp_form_shop_age_overall = parsed_data.get('shop_age_overall', st.session_state.get('opp_form_shop_age_overall','')) # Assign parsed shop age
-                            st.session_state.opp_form_category = parsed_data.get('category', st.session_state.get('opp_form_category',''))
-                            st.session_state.opp_form_listing_type = parsed_data.get('listing_type', st.session_state.get('opp_form_listing_type',''))
-                            st.session_state.tags_list = parsed_data.get('tags_list', []) # Update general tags list
-                            st.session_state.opp_form_last_30_days_sales_str = parsed_data.get('last_30_days_sales', '')
+                            ss.opp_form_est_revenue_str = parsed_data.get('monthly_revenue_str_display', str(parsed_data.get('monthly_revenue', '')))
+                            ss.opp_form_conversion_rate = parsed_data.get('conversion_rate', ss.get('opp_form_conversion_rate','')) # Correctly strips % in parser
+                            ss.opp_form_listing_age = parsed_data.get('listing_age', ss.get('opp_form_listing_age',''))
+                            ss.opp_form_shop_age_overall = parsed_data.get('shop_age_overall', ss.get('opp_form_shop_age_overall','')) # Assign parsed shop age
+                            ss.opp_form_category = parsed_data.get('category', ss.get('opp_form_category',''))
+                            ss.opp_form_listing_type = parsed_data.get('listing_type', ss.get('opp_form_listing_type',''))
+                            ss.tags_list = parsed_data.get('tags_list', []) # Update general tags list
+                            ss.opp_form_last_30_days_sales_str = parsed_data.get('last_30_days_sales', '')
                             # Calculate 30d Revenue using ETSY PRICE float
-                            price_val = st.session_state.get('etsy_price_float')
+                            price_val = ss.get('etsy_price_float')
                             sales_30d_str = parsed_data.get('last_30_days_sales')
                             if price_val is not None and sales_30d_str:
                                 try:
                                     sales_30d_int = int(str(sales_30d_str).replace(',', ''))
-                                    st.session_state.opp_form_last_30_days_revenue_str = f"{(price_val * sales_30d_int):.2f}"
-                                except: st.session_state.opp_form_last_30_days_revenue_str = "Error"
-                            else: st.session_state.opp_form_last_30_days_revenue_str = ""
+                                    ss.opp_form_last_30_days_revenue_str = f"{(price_val * sales_30d_int):.2f}"
+                                except: ss.opp_form_last_30_days_revenue_str = "Error"
+                            else: ss.opp_form_last_30_days_revenue_str = ""
                             # Append notes to FORM notes field
                             notes_key = 'opp_form_notes'
-                            existing_notes = st.session_state.get(notes_key, "")
+                            existing_notes = ss.get(notes_key, "")
+                            if not existing_notes: # Notes emptied since the last parse: sections may be added again
+                                ss.notes_has_description = ss.notes_has_review_dates = ss.notes_has_everbee = False
                             eb_notes = parsed_data.get('notes', '') # Get notes from parser
-                            if eb_notes and "--- Everbee" not in existing_notes: # Avoid duplicates
-                                existing_notes += f"\n\n{eb_notes}"
-                            st.session_state[notes_key] = existing_notes.strip()
+                            if eb_notes and not ss.notes_has_everbee: # Avoid duplicates
+                                existing_notes += f"\n\n{eb_notes}"; ss.notes_has_everbee = True
+                            ss[notes_key] = existing_notes.strip()
                             st.success("Everbee text parsed and form fields updated!")
-                        else: st.warning("Everbee parsing failed.")
+                        else: st.warning("Everbee parsing failed: no text content found.")
                     except Exception as e: st.error(f"Error parsing Everbee text: {e}")
             else: st.warning("Please paste Everbee text.")
 
@@ -1499,86 +1662,18 @@ Products must target $30+ price points.
         # --- Display Parsed Everbee Tags ---
         st.subheader("Parsed Everbee Tags")
         if st.session_state.tags_list: # Use general key
-            tags_df = pd.DataFrame(st.session_state.tags_list)
-            display_columns = ['name', 'volume', 'competition', 'score', 'level']
-            tags_df = tags_df[[col for col in display_columns if col in tags_df.columns]]
-            st.dataframe(tags_df, use_container_width=True, hide_index=True)
+            # The list of dicts goes straight to the table; column_order fixes the display order
+            st.dataframe(st.session_state.tags_list, column_order=_EVERBEE_TAG_DISPLAY_COLUMNS, use_container_width=True, hide_index=True)
         else: st.info("No Everbee tags parsed or available in current session.")
 
         # REMOVE on_click from the button below
         if st.button("Add/Update Opportunity in Database", key="add_update_opp_button"): #, on_click=clear_opportunity_form_flag):
-            # --- Read data from FORM session_state keys ---
-            product_title = st.session_state.opp_form_product_title
-            product_url = st.session_state.opp_form_product_url
-            shop_name = st.session_state.opp_form_shop_name
-            shop_url = st.session_state.opp_form_shop_url 
-            price_str = st.session_state.opp_form_price_str
-            processing_time = st.session_state.opp_form_processing_time 
-            shipping_cost_str = st.session_state.opp_form_shipping_cost_str 
-            is_digital = st.session_state.is_digital # Use general key
-            est_revenue_str = st.session_state.opp_form_est_revenue_str
-            est_sales_str = st.session_state.opp_form_est_sales_str
-            niche_tags = st.session_state.opp_form_niche_tags
-            aliexpress_urls = st.session_state.opp_form_aliexpress_urls
-            notes = st.session_state.opp_form_notes
-            total_sales_str = st.session_state.opp_form_total_sales_str
-            views_str = st.session_state.opp_form_views_str
-            favorites_str = st.session_state.opp_form_favorites_str
-            conversion_rate = st.session_state.opp_form_conversion_rate
-            listing_age = st.session_state.opp_form_listing_age
-            shop_age_overall = st.session_state.opp_form_shop_age_overall 
-            category = st.session_state.opp_form_category 
-            listing_type = st.session_state.opp_form_listing_type 
-            everbee_tags_list = st.session_state.tags_list # Use general key
-            last_30_days_sales_str = st.session_state.opp_form_last_30_days_sales_str 
-            last_30_days_revenue_str = st.session_state.opp_form_last_30_days_revenue_str 
-
-            # --- Data Validation and Type Conversion ---
-            price = None; shipping_cost = None; est_revenue = None; est_sales = None
-            total_sales = None; views = None; favorites = None; monthly_reviews = None
-            last_30_days_sales = None; last_30_days_revenue = None
-            input_valid = True
-
-            if not all([product_title, product_url]):
-                st.warning("Product Title and Product URL are required."); input_valid = False
-
-            price, price_valid = validate_float(price_str, "Price")
-            shipping_cost, sc_valid = validate_float(shipping_cost_str, "Shipping Cost")
-            est_revenue, er_valid = validate_float(est_revenue_str, "Est. Monthly Revenue")
-            est_sales, es_valid = validate_int(est_sales_str, "Est. Monthly Sales")
-            total_sales, ts_valid = validate_int(total_sales_str, "Total Sales")
-            views, v_valid = validate_int(views_str, "Total Views")
-            favorites, f_valid = validate_int(favorites_str, "Total Favorites")
-            # monthly_reviews is not read from form state, so skip validation
-            last_30_days_sales, l30ds_valid = validate_int(last_30_days_sales_str, "Last 30 Days Sales")
-            last_30_days_revenue, l30dr_valid = validate_float(last_30_days_revenue_str, "Last 30 Days Revenue")
-
-            if not (price_valid and sc_valid and er_valid and es_valid and ts_valid and v_valid and f_valid and l30ds_valid and l30dr_valid):
-                input_valid = False
-
-            if input_valid:
-                cleaned_product_url = clean_etsy_url(product_url)
-                cleaned_shop_url = clean_etsy_url(shop_url)
-
-                opportunity_data = {
-                    "product_title": product_title, "price": price,
-                    "product_url": cleaned_product_url, "shop_name": shop_name,
-                    "shop_url": cleaned_shop_url, "niche_tags": niche_tags,
-                    "est_monthly_revenue": est_revenue, "est_monthly_sales": est_sales,
-                    "processing_time": processing_time, "shipping_cost": shipping_cost,
-                    "aliexpress_urls": aliexpress_urls.replace('\n', ', '), "is_digital": is_digital,
-                    "notes": notes, "total_sales": total_sales, "views": views,
-                    "favorites": favorites, "conversion_rate": conversion_rate,
-                    "listing_age": listing_age, "shop_age_overall": shop_age_overall,
-                    "category": category, "listing_type": listing_type,
-                    "everbee_tags": everbee_tags_list, # Pass the list directly
-                    "last_30_days_sales": last_30_days_sales,
-                    "last_30_days_revenue": last_30_days_revenue
-                }
-
+            opportunity_data = handle_submit(st.session_state) # None (after warnings) if the form is invalid
+            if opportunity_data:
                 inserted_id = db.add_opportunity(opportunity_data)
                 if inserted_id:
-                    st.success(f"Successfully added '{product_title}' (ID: {inserted_id}) to the database!")
+                    clear_opportunity_caches() # New row: reload the saved opportunities table
+                    st.success(f"Successfully added '{opportunity_data['product_title']}' (ID: {inserted_id}) to the database!")
                     # SET FLAG HERE instead of using on_click
                     st.session_state.clear_form = True 
                     # The rerun will trigger the check at the top to clear the form
@@ -1586,78 +1681,83 @@ Products must target $30+ price points.
                 else: st.error("Failed to add opportunity. Check if URL already exists.")
 
     # --- Saved Opportunities Display ---
-    st.header("3. Saved Opportunities")
-    with st.expander("Delete Opportunity", expanded=False):
-        del_col1, del_col2 = st.columns([1, 3])
-        with del_col1: id_to_delete = st.number_input("Enter ID to Delete", min_value=1, step=1, value=None, key="delete_id_input")
-        with del_col2:
-            st.caption(" "); st.caption(" ")
-            if st.button("🗑️ Delete Opportunity by ID", key="delete_button"):
-                if id_to_delete:
-                    with st.spinner(f"Deleting ID: {id_to_delete}..."):
-                        if db.delete_opportunity_by_id(id_to_delete): st.success(f"Deleted ID: {id_to_delete}"); st.rerun()
-                        else: st.error(f"Failed to delete ID: {id_to_delete}.")
-                else: st.warning("Please enter an ID.")
-
-    # --- Fetch and Display Opportunities --- 
-    opportunities_df = db.get_all_opportunities() # Moved up
-    if opportunities_df is None or opportunities_df.empty:
-        st.info("No opportunities saved yet or failed to load data.")
-    else:
-        filter_col1, filter_col2 = st.columns([1, 3]); # Basic Filtering
-        with filter_col1: filter_term = st.text_input("Filter by Title/Shop/Tags")
-        filtered_df = opportunities_df
-        if filter_term:
-            search_mask = (
-                filtered_df['product_title'].str.contains(filter_term, case=False, na=False) |
-                filtered_df['shop_name'].str.contains(filter_term, case=False, na=False) |
-                filtered_df['niche_tags'].str.contains(filter_term, case=False, na=False)
+    @st.fragment
+    def render_saved_opportunities():
+        """Delete box, filter and table. Typing a filter or deleting a row reruns only this fragment, not the whole app."""
+        st.header("3. Saved Opportunities")
+        with st.expander("Delete Opportunity", expanded=False):
+            del_col1, del_col2 = st.columns([1, 3])
+            with del_col1: id_to_delete = st.number_input("Enter ID to Delete", min_value=1, step=1, value=None, key="delete_id_input")
+            with del_col2:
+                st.caption(" "); st.caption(" ")
+                if st.button("🗑️ Delete Opportunity by ID", key="delete_button"):
+                    if id_to_delete:
+                        with st.spinner(f"Deleting ID: {id_to_delete}..."):
+                            if db.delete_opportunity_by_id(id_to_delete): clear_opportunity_caches(); st.success(f"Deleted ID: {id_to_delete}") # Table below reloads in this same run
+                            else: st.error(f"Failed to delete ID: {id_to_delete}.")
+                    else: st.warning("Please enter an ID.")
+
+        # --- Fetch and Display Opportunities --- 
+        opportunities_df = load_opportunities() # Moved up; cached until an add/delete clears it
+        if opportunities_df is None or opportunities_df.empty:
+            st.info("No opportunities saved yet or failed to load data.")
+        else:
+            filter_col1, filter_col2 = st.columns([1, 3]); # Basic Filtering
+            with filter_col1: filter_term = st.text_input("Filter by Title/Shop/Tags")
+            filtered_df = opportunities_df
+            if filter_term:
+                filter_cache = st.session_state.opportunity_filter_cache
+                if filter_cache is not None and filter_cache[0] == filter_term:
+                    filtered_df = filter_cache[1] # Rerun from another widget: same term, reuse its rows
+                else:
+                    # One literal substring scan over the cached title/shop/tags text (not three regex passes)
+                    search_mask = opportunity_search_text().str.contains(filter_term.casefold(), regex=False).to_numpy()
+                    filtered_df = filtered_df[search_mask]
+                    st.session_state.opportunity_filter_cache = (filter_term, filtered_df)
+
+            # Only the first rows_shown rows reach the browser; "Show more" extends the window
+            rows_shown = st.session_state.opportunity_rows_shown
+            # Configure DataFrame display using keys from CURRENT init_session_state
+            st.dataframe(
+                filtered_df.head(rows_shown),
+                column_config={
+                    "id": st.column_config.NumberColumn("ID", width="small"),
+                    "product_url": st.column_config.LinkColumn("Product URL", display_text="🔗", width="small"),
+                    "shop_url": st.column_config.LinkColumn("Shop URL", display_text="🔗", width="small"),
+                    "product_title": st.column_config.TextColumn("Product Title", width="large"),
+                    "shop_name": st.column_config.TextColumn("Shop Name", width="medium"),
+                    "price": st.column_config.NumberColumn("Price", format="$%.2f"),
+                    "shipping_cost": st.column_config.NumberColumn("Shp Cost", format="$%.2f"),
+                    "processing_time": st.column_config.TextColumn("Prc+Shp Time", width="medium"), 
+                    "est_monthly_revenue": st.column_config.NumberColumn("Avg Mo Rev", format="$%.0f"),
+                    "est_monthly_sales": st.column_config.NumberColumn("Avg Mo Sales"),
+                    "last_30_days_sales": st.column_config.NumberColumn("Last 30d Sales"),
+                    "last_30_days_revenue": st.column_config.NumberColumn("Last 30d Rev", format="$%.0f"),
+                    "total_sales": st.column_config.NumberColumn("Total Sales"),
+                    "views": st.column_config.NumberColumn("Views"),
+                    "favorites": st.column_config.NumberColumn("Favs"),
+                    "conversion_rate": st.column_config.TextColumn("Conv Rate"),
+                    "listing_age": st.column_config.TextColumn("Listing Age"),
+                    "shop_age_overall": st.column_config.TextColumn("Shop Age"),
+                    "category": st.column_config.TextColumn("Category", width="medium"),
+                    # "monthly_reviews": st.column_config.NumberColumn("Mo Revs"), # Not in current state/form
+                    "listing_type": st.column_config.TextColumn("Type"),
+                    "niche_tags": st.column_config.TextColumn("Niche Tags", width="medium"),
+                    "aliexpress_urls": st.column_config.TextColumn("Ali URLs", width="medium"),
+                    "notes": st.column_config.TextColumn("Notes", width="large"),
+                    "added_at": st.column_config.DatetimeColumn("Added", format="YYYY-MM-DD HH:mm"),
+                    "is_digital": st.column_config.CheckboxColumn("Digital?", width="small"),
+                    "everbee_tags": st.column_config.TextColumn("Tags Data", width="medium") # Needs formatting if list/dict
+                },
+                column_order=_OPPORTUNITY_DISPLAY_COLUMNS,
+                hide_index=True,
+                use_container_width=True
             )
-            filtered_df = filtered_df[search_mask]
+            if len(filtered_df) > rows_shown:
+                st.caption(f"Showing {rows_shown} of {len(filtered_df)} opportunities.")
+                st.button("Show more", key="show_more_opportunities", on_click=show_more_opportunities)
 
-        # Configure DataFrame display using keys from CURRENT init_session_state
-        st.dataframe(
-            filtered_df,
-            column_config={
-                "id": st.column_config.NumberColumn("ID", width="small"),
-                "product_url": st.column_config.LinkColumn("Product URL", display_text="🔗", width="small"),
-                "shop_url": st.column_config.LinkColumn("Shop URL", display_text="🔗", width="small"),
-                "product_title": st.column_config.TextColumn("Product Title", width="large"),
-                "shop_name": st.column_config.TextColumn("Shop Name", width="medium"),
-                "price": st.column_config.NumberColumn("Price", format="$%.2f"),
-                "shipping_cost": st.column_config.NumberColumn("Shp Cost", format="$%.2f"),
-                "processing_time": st.column_config.TextColumn("Prc+Shp Time", width="medium"), 
-                "est_monthly_revenue": st.column_config.NumberColumn("Avg Mo Rev", format="$%.0f"),
-                "est_monthly_sales": st.column_config.NumberColumn("Avg Mo Sales"),
-                "last_30_days_sales": st.column_config.NumberColumn("Last 30d Sales"),
-                "last_30_days_revenue": st.column_config.NumberColumn("Last 30d Rev", format="$%.0f"),
-                "total_sales": st.column_config.NumberColumn("Total Sales"),
-                "views": st.column_config.NumberColumn("Views"),
-                "favorites": st.column_config.NumberColumn("Favs"),
-                "conversion_rate": st.column_config.TextColumn("Conv Rate"),
-                "listing_age": st.column_config.TextColumn("Listing Age"),
-                "shop_age_overall": st.column_config.TextColumn("Shop Age"),
-                "category": st.column_config.TextColumn("Category", width="medium"),
-                # "monthly_reviews": st.column_config.NumberColumn("Mo Revs"), # Not in current state/form
-                "listing_type": st.column_config.TextColumn("Type"),
-                "niche_tags": st.column_config.TextColumn("Niche Tags", width="medium"),
-                "aliexpress_urls": st.column_config.TextColumn("Ali URLs", width="medium"),
-                "notes": st.column_config.TextColumn("Notes", width="large"),
-                "added_at": st.column_config.DatetimeColumn("Added", format="YYYY-MM-DD HH:mm"),
-                "is_digital": st.column_config.CheckboxColumn("Digital?", width="small"),
-                "everbee_tags": st.column_config.TextColumn("Tags Data", width="medium") # Needs formatting if list/dict
-            },
-            # Updated column order to match keys
-            column_order=("id", "product_title", "shop_name", "price", "est_monthly_revenue", 
-                          "est_monthly_sales", "last_30_days_sales", "last_30_days_revenue",
-                          "total_sales", "listing_age", "shop_age_overall",
-                          "category", "product_url", "shop_url", "processing_time", 
-                          "shipping_cost", "views", "favorites", "conversion_rate", #"monthly_reviews", 
-                          "listing_type", "is_digital", "niche_tags", 
-                          "aliexpress_urls", "notes", "added_at", "everbee_tags"),
-            hide_index=True,
-            use_container_width=True
-        )
+    render_saved_opportunities()
 # End of Tab 1
 
 # ============================ #
@@ -1695,51 +1795,44 @@ with tab2:
                     st.info(f"Detected Country: {st.session_state.erank_country_code}")
 
                     if parsed_erank_data:
-                        # Process a COPY for current session display
-                        erank_df = pd.DataFrame(parsed_erank_data.copy())
+                        # Build the current session frame (new columns don't touch the raw list)
+                        erank_df = pd.DataFrame(parsed_erank_data)
                         st.info(f"ERANK text parsed! Found {len(erank_df)} raw keyword entries. Analyzing for current view...")
                         
                         # --- Apply Scoring for Current View --- 
-                        erank_df['Searches_Num'] = erank_df['Avg Searches'].apply(clean_erank_value)
-                        erank_df['CTR_Num'] = erank_df['Avg CTR'].apply(clean_erank_value)
-                        erank_df['Competition_Num'] = erank_df['Etsy Competition'].apply(clean_erank_value)
-                        erank_df['Searches_Score'] = erank_df['Searches_Num'].apply(score_searches)
-                        erank_df['CTR_Score'] = erank_df['CTR_Num'].apply(score_ctr)
-                        erank_df['Competition_Score'] = erank_df['Competition_Num'].apply(score_competition)
+                        add_erank_score_columns(erank_df)
+                        # Keep the cleaned/score columns with the raw strings so saving doesn't score again
+                        st.session_state['raw_erank_data'] = erank_df[ERANK_RAW_COLUMNS + ERANK_DERIVED_COLUMNS].to_dict('list')
                         
                         current_w_searches = st.session_state.w_searches
                         current_w_ctr = st.session_state.w_ctr
                         current_w_comp = st.session_state.w_comp
 
                         # Calculate final score using absolute scores and weights
-                        erank_df['Opportunity Score'] = (
-                            (current_w_searches * erank_df['Searches_Score']) +
-                            (current_w_ctr * erank_df['CTR_Score']) +
-                            (current_w_comp * erank_df['Competition_Score'])
-                        )
+                        erank_df['Opportunity Score'] = opportunity_scores(erank_df, current_w_searches, current_w_ctr, current_w_comp)
                         # --- End Scoring --- 
                         
                         erank_df_sorted = erank_df.sort_values(by='Opportunity Score', ascending=False, na_position='last')
-                        # Store SCORED data for current session display
-                        st.session_state['erank_keywords_list'] = erank_df_sorted.to_dict('records')
+                        # Store SCORED frame as-is for current session display (no records round-trip)
+                        st.session_state['erank_keywords_df'] = erank_df_sorted
                         st.success(f"ERANK data analyzed and scored for current view!")
                     else:
                         st.warning("ERANK parsing failed to extract keyword data.")
-                        st.session_state['erank_keywords_list'] = []
-                        st.session_state['raw_erank_data'] = [] # Clear raw data too
+                        st.session_state['erank_keywords_df'] = pd.DataFrame()
+                        st.session_state['raw_erank_data'] = {} # Clear raw data too
                         st.session_state['erank_country_code'] = None # Clear country code too
                 except Exception as e:
                     st.error(f"ERANK Analysis Error: {e}")
-                    st.session_state['erank_keywords_list'] = []
-                    st.session_state['raw_erank_data'] = [] # Clear raw data on error
+                    st.session_state['erank_keywords_df'] = pd.DataFrame()
+                    st.session_state['raw_erank_data'] = {} # Clear raw data on error
                     st.session_state['erank_country_code'] = None # Clear country code on error
         else: 
             st.warning("Please paste ERANK text.")
 
     # --- Display Analyzed ERANK data (Current Session) --- 
     st.subheader("Analyzed Keywords (Current Session)")
-    if st.session_state.get('erank_keywords_list'):
-        erank_display_df_current = pd.DataFrame(st.session_state['erank_keywords_list'])
+    erank_display_df_current = st.session_state.get('erank_keywords_df')
+    if erank_display_df_current is not None and not erank_display_df_current.empty:
         display_columns_current = [
             'Opportunity Score', 'Keyword', 'Avg Searches', 'Avg CTR', # Removed Data Date - not needed for current session?
             'Etsy Competition', 'Avg Clicks', 'Google Searches'
@@ -1747,18 +1840,15 @@ with tab2:
         # Filter columns to display safely
         erank_display_df_current = erank_display_df_current[[col for col in display_columns_current if col in erank_display_df_current.columns]]
         
-        # Format Opportunity Score
-        if 'Opportunity Score' in erank_display_df_current.columns:
-             try: 
-                 erank_display_df_current['Opportunity Score'] = pd.to_numeric(erank_display_df_current['Opportunity Score'], errors='coerce').map(lambda x: f'{x:.3f}' if pd.notna(x) else 'N/A')
-             except Exception as fmt_e: 
-                 print(f"Warning: Could not format Score for current session display: {fmt_e}")
-                 
-        st.dataframe(erank_display_df_current, use_container_width=True, hide_index=True)
+        st.dataframe(
+            erank_display_df_current,
+            column_config={"Opportunity Score": st.column_config.NumberColumn(format="%.3f")},
+            use_container_width=True, hide_index=True
+        )
 
         # --- Save Button --- 
         if st.button("💾 Save Current Raw Keyword Data", key="save_erank_button"):
-            current_raw_data = st.session_state.get('raw_erank_data', [])
+            current_raw_data = st.session_state.get('raw_erank_data', {})
             current_weights = {'w_searches': st.session_state.w_searches, 'w_ctr': st.session_state.w_ctr, 'w_comp': st.session_state.w_comp}
             # Get seed keyword from the input box at the time of saving
             seed_keyword = st.session_state.erank_seed_keyword or None
@@ -1766,10 +1856,15 @@ with tab2:
             country_code = st.session_state.get('erank_country_code', 'Unknown') 
             
             if current_raw_data:
-                # Call updated db function with RAW data and country code
-                saved_analysis_id = db.add_erank_analysis(seed_keyword, country_code, current_weights, current_raw_data)
+                # Numeric/score columns were computed at analysis time and travel with the raw strings
+                scored_raw_data = pd.DataFrame(current_raw_data).to_dict('records')
+                # Call updated db function with RAW data, precomputed scores and country code
+                saved_analysis_id = db.add_erank_analysis(seed_keyword, country_code, current_weights, scored_raw_data)
                 if saved_analysis_id:
-                     st.success(f"Saved analysis metadata (ID: {saved_analysis_id}, Country: {country_code}) and {len(current_raw_data)} raw keywords.")
+                     load_scored_erank_keywords.clear() # Invalidate cached global keywords
+                     rank_global_erank_keywords.clear()
+                     global_erank_score_matrix.clear()
+                     st.success(f"Saved analysis metadata (ID: {saved_analysis_id}, Country: {country_code}) and {len(current_raw_data['Keyword'])} raw keywords.")
                      # Refresh the global keywords display after saving
                      st.rerun()
                 else: 
@@ -1783,7 +1878,7 @@ with tab2:
     st.divider()
     st.subheader("Global Keyword Analysis (All Saved Raw Data)")
     
-    all_keywords_df = db.get_all_erank_keywords() # Now includes Country column
+    all_keywords_df = load_scored_erank_keywords() # Now includes Country column (cached until next save)
     
     if all_keywords_df.empty:
         st.info("No keywords saved to the database yet. Save data from a session above.")
@@ -1791,29 +1886,19 @@ with tab2:
         st.info(f"Found {len(all_keywords_df)} total saved keywords. Applying current weights for global ranking...")
         with st.spinner("Analyzing all saved keywords..."):
             try:
-                # Create a copy to avoid modifying the original DataFrame from DB
-                # Use .loc for modifications to avoid SettingWithCopyWarning
-                df_processed = all_keywords_df.copy()
-                
-                # --- Apply Scoring to ALL Keywords --- 
-                df_processed.loc[:, 'Searches_Num'] = df_processed['Avg Searches'].apply(clean_erank_value)
-                df_processed.loc[:, 'CTR_Num'] = df_processed['Avg CTR'].apply(clean_erank_value)
-                df_processed.loc[:, 'Competition_Num'] = df_processed['Etsy Competition'].apply(clean_erank_value)
-                df_processed.loc[:, 'Searches_Score'] = df_processed['Searches_Num'].apply(score_searches)
-                df_processed.loc[:, 'CTR_Score'] = df_processed['CTR_Num'].apply(score_ctr)
-                df_processed.loc[:, 'Competition_Score'] = df_processed['Competition_Num'].apply(score_competition)
+                # Cached frame is a fresh copy per call, with scores precomputed at save time
+                df_processed = all_keywords_df
                 
                 current_w_searches_global = st.session_state.w_searches
                 current_w_ctr_global = st.session_state.w_ctr
                 current_w_comp_global = st.session_state.w_comp
                 
-                df_processed.loc[:, 'Opportunity Score'] = (
-                    (current_w_searches_global * df_processed['Searches_Score']) +
-                    (current_w_ctr_global * df_processed['CTR_Score']) +
-                    (current_w_comp_global * df_processed['Competition_Score'])
+                global_scores, global_order = rank_global_erank_keywords(
+                    current_w_searches_global, current_w_ctr_global, current_w_comp_global
                 )
+                df_processed['Opportunity Score'] = global_scores
                 
-                df_sorted_global = df_processed.sort_values(by='Opportunity Score', ascending=False, na_position='last')
+                df_sorted_global = df_processed.iloc[global_order]
                 
                 # Add Country to the display columns
                 display_columns_global = [
@@ -1821,28 +1906,22 @@ with tab2:
                     'Etsy Competition', 'Avg Clicks', 'Google Searches', 
                     'analysis_id', 'keyword_id' 
                 ]
-                df_display_global = df_sorted_global[[col for col in display_columns_global if col in df_sorted_global.columns]].copy() # Create copy for display formatting
-                
-                # Format Opportunity Score and Added At date (using .loc)
-                if 'Opportunity Score' in df_display_global.columns:
-                    try:
-                         # Convert to numeric first, handling errors, then format
-                         scores_numeric = pd.to_numeric(df_display_global['Opportunity Score'], errors='coerce')
-                         df_display_global.loc[:, 'Opportunity Score'] = scores_numeric.map(lambda x: f'{x:.3f}' if pd.notna(x) else 'N/A')
-                    except Exception as fmt_e: 
-                        print(f"Warning: Could not format Score for global display: {fmt_e}")
-                if 'Added At' in df_display_global.columns:
-                    try:
-                        # Use .loc; Format as YYYY-MM-DD only
-                        df_display_global.loc[:, 'Added At'] = pd.to_datetime(df_display_global['Added At'], errors='coerce').dt.strftime('%Y-%m-%d') 
-                    except Exception as fmt_e:
-                        print(f"Warning: Could not format Added At date for global display: {fmt_e}")
+                df_display_global = df_sorted_global[[col for col in display_columns_global if col in df_sorted_global.columns]]
                 
-                st.dataframe(df_display_global, use_container_width=True, hide_index=True, height=600)
+                # Score and date stay numeric/datetime; formatting is applied client-side.
+                # Native dtypes convert to Arrow in one columnar pass, so hand Streamlit the table directly.
+                st.dataframe(
+                    pa.Table.from_pandas(df_display_global, preserve_index=False),
+                    column_config={
+                        "Opportunity Score": st.column_config.NumberColumn(format="%.3f"),
+                        "Added At": st.column_config.DatetimeColumn(format="YYYY-MM-DD")
+                    },
+                    use_container_width=True, hide_index=True, height=600
+                )
 
                 # --- Add CSV Export Button for Global Keywords ---
                 if not df_display_global.empty:
-                    csv_data = df_display_global.to_csv(index=False).encode('utf-8')
+                    csv_data = df_display_global.to_csv(index=False, float_format='%.3f', date_format='%Y-%m-%d').encode('utf-8')
                     st.download_button(
                         label="📥 Download Global Keywords as CSV",
                         data=csv_data,
@@ -1905,13 +1984,10 @@ with tab3:
             if url_to_save: 
                 url_to_save = url_to_save.strip()
 
-            # Define the regex pattern for validation
-            etsy_shop_pattern = r"https?://(?:www\.)?etsy\.com/(?:[a-z]{2}/)?shop/[A-Za-z0-9_-]+"
-
             if not url_to_save:
                 st.warning("Please enter a shop URL.")
             # Use regex search for validation (case-insensitive)
-            elif not re.search(etsy_shop_pattern, url_to_save, re.IGNORECASE):
+            elif not _ETSY_SHOP_URL_RE.search(url_to_save):
                  st.warning("Please enter a valid Etsy shop URL (e.g., https://www.etsy.com/shop/ShopName).")
             else:
                 # Clean the URL before saving (removes query params etc.)
@@ -6,9 +6,17 @@ import numpy as np
 
 DB_NAME = "etsy_opportunities.db"
 
+def _connect():
+    """Opens a connection to DB_NAME. With the WAL journal set up in initialize_db(),
+    synchronous=NORMAL only syncs at checkpoints instead of on every commit."""
+    conn = sqlite3.connect(DB_NAME)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
 def initialize_db():
     """Initializes the SQLite database and creates/updates tables."""
-    conn = sqlite3.connect(DB_NAME)
+    conn = _connect()
+    conn.execute("PRAGMA journal_mode=WAL") # Persistent: stored in the database file
     cursor = conn.cursor()
     
     # --- Schema Versioning/Migration (Opportunities Table) --- 
@@ -64,6 +72,8 @@ def initialize_db():
             last_30_days_revenue REAL
         )
     ''')
+    # Newest-first listing (get_all_opportunities) walks this index instead of sorting the table
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_opportunities_added_at ON opportunities (added_at)")
 
     # --- Update ERANK Analyses Table (Add country_code column) ---
     cursor.execute("PRAGMA table_info(erank_keyword_analyses)")
@@ -145,6 +155,12 @@ def initialize_db():
             avg_ctr_str TEXT,
             etsy_competition_str TEXT,
             google_searches_str TEXT,
+            searches_num REAL,
+            ctr_num REAL,
+            competition_num REAL,
+            searches_score REAL,
+            ctr_score REAL,
+            competition_score REAL,
             FOREIGN KEY (analysis_id) REFERENCES erank_keyword_analyses (id)
         )
     '''
@@ -190,6 +206,21 @@ def initialize_db():
          # If added_at already exists, ensure table exists anyway (idempotent)
          create_sql = correct_schema_sql.replace('_new', '').replace('CREATE TABLE', 'CREATE TABLE IF NOT EXISTS')
          cursor.execute(create_sql)
+
+    # --- Add precomputed numeric/score columns to ERANK keywords (computed once at save time) ---
+    cursor.execute("PRAGMA table_info(erank_keywords)")
+    columns_erank_kw = [info[1] for info in cursor.fetchall()]
+    required_columns_erank_kw = [
+        ('searches_num', 'REAL'), ('ctr_num', 'REAL'), ('competition_num', 'REAL'),
+        ('searches_score', 'REAL'), ('ctr_score', 'REAL'), ('competition_score', 'REAL')
+    ]
+    for col_name, col_type in required_columns_erank_kw:
+        if col_name not in columns_erank_kw:
+            try:
+                cursor.execute(f"ALTER TABLE erank_keywords ADD COLUMN {col_name} {col_type}")
+                print(f"Added '{col_name}' column to erank_keywords table.")
+            except sqlite3.OperationalError as e:
+                print(f"Warning: Could not add column '{col_name}' to erank_keywords: {e}")
             
     # --- Backfill NULL added_at dates (Revised) --- 
     try:
@@ -221,43 +252,46 @@ def initialize_db():
     conn.close()
     print("Database initialized successfully.")
 
-def add_opportunity(data):
-    """Adds a new opportunity to the database. Returns the ID of the inserted row or None if failed."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    try:
-        # Prepare data, converting list-based fields to JSON
-        tags_json = None
-        if 'everbee_tags' in data and isinstance(data['everbee_tags'], list):
-            try:
-                tags_json = json.dumps(data['everbee_tags'])
-            except TypeError as e:
-                print(f"Error converting Everbee tags to JSON: {e}.")
-                tags_json = None
+def _insert_opportunity(cursor, data):
+    """Inserts one opportunity dict through cursor (no commit). Returns the new row ID."""
+    # Prepare data: everbee_tags arrives pre-encoded from the app; lists (other callers) are converted here
+    tags_json = None
+    if isinstance(data.get('everbee_tags'), str):
+        tags_json = data['everbee_tags']
+    elif 'everbee_tags' in data and isinstance(data['everbee_tags'], list):
+        try:
+            tags_json = json.dumps(data['everbee_tags'])
+        except TypeError as e:
+            print(f"Error converting Everbee tags to JSON: {e}.")
+            tags_json = None
 
-        # Prepare column names and placeholders dynamically
-        valid_data = {k: v for k, v in data.items() if v is not None}
-        
-        # Overwrite with JSON strings if conversion was successful
-        if tags_json is not None:
-            valid_data['everbee_tags'] = tags_json
-        else:
-            valid_data.pop('everbee_tags', None)
+    # Prepare column names and placeholders dynamically
+    valid_data = {k: v for k, v in data.items() if v is not None}
+    
+    # Overwrite with JSON strings if conversion was successful
+    if tags_json is not None:
+        valid_data['everbee_tags'] = tags_json
+    else:
+        valid_data.pop('everbee_tags', None)
 
-        # Ensure boolean is 0 or 1 if present
-        if 'is_digital' in valid_data:
-             valid_data['is_digital'] = 1 if valid_data['is_digital'] else 0
-        if 'is_potential_dropshipper' in valid_data:
-             valid_data['is_potential_dropshipper'] = 1 if valid_data['is_potential_dropshipper'] else 0
-            
-        columns = ', '.join(valid_data.keys())
-        placeholders = ', '.join('?' * len(valid_data))
-        sql = f'INSERT INTO opportunities ({columns}) VALUES ({placeholders});'
-        values = tuple(valid_data.values())
+    # Ensure boolean is 0 or 1 if present
+    if 'is_digital' in valid_data:
+         valid_data['is_digital'] = 1 if valid_data['is_digital'] else 0
+    if 'is_potential_dropshipper' in valid_data:
+         valid_data['is_potential_dropshipper'] = 1 if valid_data['is_potential_dropshipper'] else 0
         
-        cursor.execute(sql, values)
-        conn.commit()
-        last_id = cursor.lastrowid
+    columns = ', '.join(valid_data.keys())
+    placeholders = ', '.join('?' * len(valid_data))
+    sql = f'INSERT INTO opportunities ({columns}) VALUES ({placeholders});'
+    cursor.execute(sql, tuple(valid_data.values()))
+    return cursor.lastrowid
+
+def add_opportunity(data):
+    """Adds a new opportunity to the database. Returns the ID of the inserted row or None if failed."""
+    conn = _connect()
+    try:
+        with conn: # Commits on success, rolls back on error
+            last_id = _insert_opportunity(conn.cursor(), data)
     except sqlite3.IntegrityError as e:
         print(f"Database Error adding opportunity: {e}") # Likely UNIQUE constraint failure on product_url
         last_id = None
@@ -268,19 +302,45 @@ def add_opportunity(data):
         conn.close()
     return last_id
 
-def get_all_opportunities():
-    """Retrieves all opportunities from the database as a Pandas DataFrame."""
-    conn = sqlite3.connect(DB_NAME)
+def add_opportunities(rows):
+    """Adds several opportunities in a single transaction (one commit for the batch).
+    Returns a list of inserted IDs, with None for rows skipped as duplicates; an empty list if the batch failed."""
+    conn = _connect()
+    cursor = conn.cursor()
+    inserted_ids = []
+    try:
+        with conn:
+            for data in rows:
+                try:
+                    inserted_ids.append(_insert_opportunity(cursor, data))
+                except sqlite3.IntegrityError as e: # Only this statement is undone; the batch continues
+                    print(f"Database Error adding opportunity: {e}")
+                    inserted_ids.append(None)
+    except Exception as e:
+        print(f"Unexpected Database Error adding opportunities: {e}")
+        inserted_ids = []
+    finally:
+        conn.close()
+    return inserted_ids
+
+def get_all_opportunities(columns=None):
+    """Retrieves all opportunities from the database as a Pandas DataFrame.
+    columns: optional iterable of column names to select (names not in the table are skipped); default is every column."""
+    conn = _connect()
     try:
         # Get column names first to build DataFrame correctly even if table is empty
         cursor = conn.cursor()
         cursor.execute("PRAGMA table_info(opportunities)")
-        columns = [info[1] for info in cursor.fetchall()]
-        if not columns:
+        table_columns = [info[1] for info in cursor.fetchall()]
+        if not table_columns:
             print("Warning: Opportunities table has no columns or does not exist?")
             return pd.DataFrame()
+        if columns is None:
+            columns = table_columns
+        else:
+            columns = [col for col in columns if col in table_columns] # Only names validated against the schema reach the SQL
         
-        cursor.execute("SELECT * FROM opportunities ORDER BY added_at DESC")
+        cursor.execute(f"SELECT {', '.join(columns)} FROM opportunities ORDER BY added_at DESC")
         rows = cursor.fetchall()
         df = pd.DataFrame(rows, columns=columns)
         
@@ -303,7 +363,7 @@ def get_all_opportunities():
 
 def delete_opportunity_by_id(opportunity_id):
     """Deletes an opportunity from the database based on its ID."""
-    conn = sqlite3.connect(DB_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     try:
         cursor.execute("DELETE FROM opportunities WHERE id = ?", (opportunity_id,))
@@ -323,7 +383,7 @@ def delete_opportunity_by_id(opportunity_id):
 
 def update_potential_dropshipper_flag(opportunity_id, is_potential):
     """Updates the is_potential_dropshipper flag for a given opportunity."""
-    conn = sqlite3.connect(DB_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     try:
         cursor.execute("""
@@ -342,7 +402,7 @@ def update_potential_dropshipper_flag(opportunity_id, is_potential):
 def add_erank_analysis(seed_keyword, country_code, weights, raw_keyword_list):
     """Adds ERANK analysis metadata (incl. country) and upserts individual raw keywords, 
     considering keyword, country, and date for uniqueness."""
-    conn = sqlite3.connect(DB_NAME)
+    conn = _connect()
     conn.row_factory = sqlite3.Row 
     cursor = conn.cursor()
     analysis_id = None
@@ -368,23 +428,32 @@ def add_erank_analysis(seed_keyword, country_code, weights, raw_keyword_list):
 
         # 2. Process individual keywords (Upsert logic based on keyword + country + date)
         if isinstance(raw_keyword_list, list):
+            # Latest existing entry per keyword FOR THIS COUNTRY, fetched once instead of per keyword
+            # (ascending order so later rows overwrite earlier ones in the dict)
+            cursor.execute("""
+                SELECT k.keyword, k.id, k.added_at 
+                FROM erank_keywords k
+                JOIN erank_keyword_analyses a ON k.analysis_id = a.id
+                WHERE a.country_code = ?
+                ORDER BY k.added_at ASC
+            """, (country_code,))
+            latest_existing = {row['keyword']: row for row in cursor.fetchall()}
+            seen_keywords = set() # Repeats within this batch were already inserted/updated today
+            insert_rows = []
+            update_rows = []
+
             for kw_dict in raw_keyword_list:
                 keyword_text = kw_dict.get('Keyword')
                 if not keyword_text:
                     skipped_count += 1
                     continue # Skip if keyword text is missing
+                if keyword_text in seen_keywords:
+                    skipped_count += 1
+                    continue
+                if country_code is not None: # A NULL country never matches earlier rows, so repeats insert again
+                    seen_keywords.add(keyword_text)
 
-                # Check for existing keyword FOR THIS COUNTRY
-                # We join to get the country code associated with past keyword entries
-                cursor.execute("""
-                    SELECT k.id, k.added_at 
-                    FROM erank_keywords k
-                    JOIN erank_keyword_analyses a ON k.analysis_id = a.id
-                    WHERE k.keyword = ? AND a.country_code = ?
-                    ORDER BY k.added_at DESC 
-                    LIMIT 1
-                """, (keyword_text, country_code))
-                existing_row = cursor.fetchone() 
+                existing_row = latest_existing.get(keyword_text)
 
                 # Prepare data tuple for insert/update (excluding id and added_at initially)
                 # Note: analysis_id here links to the *current* analysis being saved.
@@ -394,17 +463,19 @@ def add_erank_analysis(seed_keyword, country_code, weights, raw_keyword_list):
                     kw_dict.get('Avg Clicks'),
                     kw_dict.get('Avg CTR'),
                     kw_dict.get('Etsy Competition'),
-                    kw_dict.get('Google Searches')
+                    kw_dict.get('Google Searches'),
+                    # Precomputed numeric/score values (NaN is stored as NULL)
+                    kw_dict.get('Searches_Num'),
+                    kw_dict.get('CTR_Num'),
+                    kw_dict.get('Competition_Num'),
+                    kw_dict.get('Searches_Score'),
+                    kw_dict.get('CTR_Score'),
+                    kw_dict.get('Competition_Score')
                 )
 
                 if existing_row is None:
                     # --- No record found for this keyword + country combination: Insert new --- 
-                    cursor.execute("""
-                        INSERT INTO erank_keywords ( 
-                            analysis_id, keyword, avg_searches_str, avg_clicks_str, 
-                            avg_ctr_str, etsy_competition_str, google_searches_str, added_at
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (analysis_id, keyword_text) + data_tuple[1:] + (current_timestamp_str,))
+                    insert_rows.append((analysis_id, keyword_text) + data_tuple[1:] + (current_timestamp_str,))
                     inserted_count += 1
                 else:
                     # --- Existing keyword found FOR THIS COUNTRY - check date --- 
@@ -425,18 +496,35 @@ def add_erank_analysis(seed_keyword, country_code, weights, raw_keyword_list):
                         skipped_count += 1
                     else:
                         # --- Update existing keyword (different date FOR THIS COUNTRY) --- 
-                        cursor.execute("""
-                            UPDATE erank_keywords 
-                            SET analysis_id = ?, 
-                                avg_searches_str = ?, 
-                                avg_clicks_str = ?, 
-                                avg_ctr_str = ?, 
-                                etsy_competition_str = ?, 
-                                google_searches_str = ?, 
-                                added_at = ? 
-                            WHERE id = ?
-                        """, data_tuple + (current_timestamp_str, existing_id))
+                        update_rows.append(data_tuple + (current_timestamp_str, existing_id))
                         updated_count += 1
+
+            # Write all inserts and updates in two batched statements
+            cursor.executemany("""
+                INSERT INTO erank_keywords ( 
+                    analysis_id, keyword, avg_searches_str, avg_clicks_str, 
+                    avg_ctr_str, etsy_competition_str, google_searches_str,
+                    searches_num, ctr_num, competition_num,
+                    searches_score, ctr_score, competition_score, added_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, insert_rows)
+            cursor.executemany("""
+                UPDATE erank_keywords 
+                SET analysis_id = ?, 
+                    avg_searches_str = ?, 
+                    avg_clicks_str = ?, 
+                    avg_ctr_str = ?, 
+                    etsy_competition_str = ?, 
+                    google_searches_str = ?, 
+                    searches_num = ?, 
+                    ctr_num = ?, 
+                    competition_num = ?, 
+                    searches_score = ?, 
+                    ctr_score = ?, 
+                    competition_score = ?, 
+                    added_at = ? 
+                WHERE id = ?
+            """, update_rows)
         
         conn.commit()
         print(f"ERANK Save Summary: Processed {len(raw_keyword_list)} keywords for analysis ID {analysis_id} (Country: {country_code}). Inserted: {inserted_count}, Updated: {updated_count}, Skipped: {skipped_count}")
@@ -451,7 +539,7 @@ def add_erank_analysis(seed_keyword, country_code, weights, raw_keyword_list):
 
 def get_all_erank_analyses():
     """Retrieves all ERANK analysis metadata entries (including country)."""
-    conn = sqlite3.connect(DB_NAME)
+    conn = _connect()
     try:
         cursor = conn.cursor()
         cursor.execute("PRAGMA table_info(erank_keyword_analyses)")
@@ -473,7 +561,7 @@ def get_all_erank_analyses():
 
 def get_all_erank_keywords():
     """Retrieves all saved ERANK keywords joined with their analysis country."""
-    conn = sqlite3.connect(DB_NAME)
+    conn = _connect()
     try:
         # Use PRAGMA to get target columns for safety
         cursor = conn.cursor()
@@ -504,7 +592,13 @@ def get_all_erank_keywords():
                 k.avg_clicks_str, 
                 k.avg_ctr_str, 
                 k.etsy_competition_str, 
-                k.google_searches_str 
+                k.google_searches_str, 
+                k.searches_num, 
+                k.ctr_num, 
+                k.competition_num, 
+                k.searches_score, 
+                k.ctr_score, 
+                k.competition_score 
             FROM erank_keywords k
             LEFT JOIN erank_keyword_analyses a ON k.analysis_id = a.id
             ORDER BY k.id ASC
@@ -515,16 +609,17 @@ def get_all_erank_keywords():
         # Define DataFrame column names in the order of the SELECT statement
         df_columns = [
             'keyword_id', 'analysis_id', 'Country', 'Keyword', 'Added At', 
-            'Avg Searches', 'Avg Clicks', 'Avg CTR', 'Etsy Competition', 'Google Searches' 
+            'Avg Searches', 'Avg Clicks', 'Avg CTR', 'Etsy Competition', 'Google Searches',
+            'Searches_Num', 'CTR_Num', 'Competition_Num',
+            'Searches_Score', 'CTR_Score', 'Competition_Score'
         ]
         
         df = pd.DataFrame(rows, columns=df_columns)
         
-        # Format Added At date
+        # Parse Added At once into datetimes (no microseconds); display formatting is left to the UI
         if 'Added At' in df.columns:
             try: 
-                # Format to YYYY-MM-DD HH:MM:S (no microseconds)
-                df['Added At'] = pd.to_datetime(df['Added At'], errors='coerce').dt.strftime('%Y-%m-%d %H:%M:%S') 
+                df['Added At'] = pd.to_datetime(df['Added At'], format='ISO8601', errors='coerce').dt.floor('s')
             except Exception as fmt_e:
                 print(f"Warning formatting Added At in get_all_erank_keywords: {fmt_e}")
 
@@ -535,6 +630,29 @@ def get_all_erank_keywords():
     finally:
         conn.close()
 
+def update_erank_keyword_scores(score_rows):
+    """Stores precomputed numeric/score values for existing ERANK keywords (backfill for rows saved
+    before these columns existed). score_rows: iterable of tuples
+    (searches_num, ctr_num, competition_num, searches_score, ctr_score, competition_score, keyword_id)."""
+    conn = _connect()
+    cursor = conn.cursor()
+    try:
+        cursor.executemany("""
+            UPDATE erank_keywords
+            SET searches_num = ?, ctr_num = ?, competition_num = ?,
+                searches_score = ?, ctr_score = ?, competition_score = ?
+            WHERE id = ?
+        """, score_rows)
+        conn.commit()
+        print(f"DEBUG DB: Backfilled scores for {cursor.rowcount} ERANK keywords.")
+        return True
+    except sqlite3.Error as e:
+        print(f"Database error backfilling ERANK keyword scores: {e}")
+        conn.rollback()
+        return False
+    finally:
+        conn.close()
+
 # Fallback function placeholder (if needed for robustness)
 # def get_all_erank_keywords_no_country():
 #     # ... implementation to fetch without country join ...
@@ -543,7 +661,7 @@ def get_all_erank_keywords():
 # --- ADDED: Saved Shops Functions --- 
 def add_saved_shop(shop_url):
     """Adds a new shop URL to the saved_shops table."""
-    conn = sqlite3.connect(DB_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     try:
         cursor.execute(
@@ -568,7 +686,7 @@ def add_saved_shop(shop_url):
 def get_all_saved_shops():
     """Retrieves all saved shop URLs from the database."""
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = _connect()
         query = "SELECT id, shop_url, added_at FROM saved_shops ORDER BY added_at DESC"
         df = pd.read_sql_query(query, conn)
         conn.close()
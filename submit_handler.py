@@ -0,0 +1,99 @@
+import streamlit as st
+import json
+try:
+    import orjson # Optional: faster tag encoding (falls back to json)
+except ImportError:
+    orjson = None
+from urllib.parse import urlparse, urlunparse
+from functools import lru_cache
+
+# --- URL Cleaning ---
+def clean_etsy_url(url):
+    if not url or '?' not in url: return url
+    return _strip_url_query(url)
+
+@lru_cache(maxsize=4096)
+def _strip_url_query(url):
+    """clean_etsy_url() for URLs with a query string; memoized since the same listing/shop URLs recur."""
+    # Ensure it handles potential missing protocol by adding it if needed for parsing
+    if not url.startswith(('http://', 'https://')):
+        url = 'https://' + url # Assume https
+    try:
+        parsed = urlparse(url)
+        # Reconstruct URL with only scheme, netloc, path
+        cleaned = urlunparse((parsed.scheme, parsed.netloc, parsed.path, '', '', ''))
+        # Remove trailing slash if present
+        if cleaned.endswith('/'):
+             cleaned = cleaned[:-1]
+        return cleaned
+    except ValueError:
+        # Handle potential errors during parsing/unparsing
+        print(f"Warning: Could not parse/clean URL: {url}")
+        return url # Return original on error
+
+# --- Validation Helpers ---
+# Opportunity columns copied verbatim from the form: database column -> session_state key
+_OPPORTUNITY_FORM_FIELDS = {
+    "product_title": "opp_form_product_title", "shop_name": "opp_form_shop_name",
+    "niche_tags": "opp_form_niche_tags", "processing_time": "opp_form_processing_time",
+    "is_digital": "is_digital", "notes": "opp_form_notes",
+    "conversion_rate": "opp_form_conversion_rate", "listing_age": "opp_form_listing_age",
+    "shop_age_overall": "opp_form_shop_age_overall", "category": "opp_form_category",
+    "listing_type": "opp_form_listing_type",
+}
+
+def encode_everbee_tags(tags_list):
+    """Everbee tag rows as the compact JSON text stored in opportunities.everbee_tags; None if not serializable."""
+    try: return orjson.dumps(tags_list).decode() if orjson else json.dumps(tags_list, separators=(',', ':'), ensure_ascii=False)
+    except TypeError as e: print(f"Error converting Everbee tags to JSON: {e}."); return None
+
+_FLOAT_STRIP = str.maketrans('', '', ',$£€') # Thousands separators and currency symbols, removed in one pass
+_INT_STRIP = str.maketrans('', '', ',')
+
+# Validators return (value, error message or None); an empty input is valid and gives None
+def validate_float(val_str, field_name):
+    if not val_str: return None, None
+    try: return float(str(val_str).translate(_FLOAT_STRIP)), None
+    except ValueError: return None, f"Invalid {field_name} format."
+
+def validate_int(val_str, field_name):
+    if not val_str: return None, None
+    try: return int(str(val_str).translate(_INT_STRIP)), None
+    except ValueError: return None, f"Invalid {field_name} format."
+
+# Numeric opportunity columns: (database column, session_state key, validator, label shown in warnings)
+_OPPORTUNITY_NUMERIC_FIELDS = (
+    ("price", "opp_form_price_str", validate_float, "Price"),
+    ("shipping_cost", "opp_form_shipping_cost_str", validate_float, "Shipping Cost"),
+    ("est_monthly_revenue", "opp_form_est_revenue_str", validate_float, "Est. Monthly Revenue"),
+    ("est_monthly_sales", "opp_form_est_sales_str", validate_int, "Est. Monthly Sales"),
+    ("total_sales", "opp_form_total_sales_str", validate_int, "Total Sales"),
+    ("views", "opp_form_views_str", validate_int, "Total Views"),
+    ("favorites", "opp_form_favorites_str", validate_int, "Total Favorites"),
+    ("last_30_days_sales", "opp_form_last_30_days_sales_str", validate_int, "Last 30 Days Sales"),
+    ("last_30_days_revenue", "opp_form_last_30_days_revenue_str", validate_float, "Last 30 Days Revenue"),
+)
+
+# --- Opportunity Form Submit ---
+def handle_submit(state):
+    """Validates the opportunity form in state (st.session_state) and builds the row for db.add_opportunity().
+    Shows one warning listing every problem and returns None if anything is invalid."""
+    errors = []
+    if not all([state.opp_form_product_title, state.opp_form_product_url]):
+        errors.append("Product Title and Product URL are required.")
+
+    numeric_values = {}
+    for col, key, validate, label in _OPPORTUNITY_NUMERIC_FIELDS:
+        numeric_values[col], error = validate(state[key], label)
+        if error: errors.append(error)
+    if errors:
+        st.warning("\n".join(f"- {error}" for error in errors)); return None
+
+    opportunity_data = {col: state[key] for col, key in _OPPORTUNITY_FORM_FIELDS.items()}
+    opportunity_data.update({
+        "product_url": clean_etsy_url(state.opp_form_product_url), "shop_url": clean_etsy_url(state.opp_form_shop_url),
+        "aliexpress_urls": ', '.join(filter(None, map(str.strip, state.opp_form_aliexpress_urls.splitlines()))),
+        "everbee_tags": encode_everbee_tags(state.tags_list),
+        **numeric_values
+    })
+    return opportunity_data